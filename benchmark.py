@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import platform
+import subprocess
+from importlib import metadata
+from concurrent.futures import ThreadPoolExecutor
+from blockedbloom import BlockedBloomFilter
+from hash160_backend import BACKENDS, get_backend
+from hashbatch import HASHLIB_RIPEMD160, ripemd160, ripemd160_batch, sha256_batch, to_array
+from secp256k1 import (
+    compress_point,
+    iterate_key_range,
+    iterate_key_range_batched,
+    jacobian_multiply_generator,
+    jacobian_to_affine,
+)
+from workerpool import create_process_pool
+
+try:
+    from bloom_filter import BloomFilter
+except ImportError:  # The Bloom filter benchmark is skipped without it (pip install bloom-filter==1.3.3)
+    BloomFilter = None
+
+# Constants
+BENCHMARK_FILE = "benchmark.json"
+FIRST_KEY = 73786976294838206464  # Keys are taken from the start of the puzzle range
+KEYS = 2048  # Keys per stage measurement
+SINGLE_KEYS = 256  # Keys hashed one at a time through each backend's hash160
+REPEATS = 3  # Each measurement keeps its best run
+TASK_KEYS = 256  # Keys per task in the worker scaling runs
+PREFIX_LENGTH = 4  # Hex characters of each hash160 added to the Bloom filter, as in bloom.py
+BLOOM_ERROR_RATE = 0.01
+REGRESSION_TOLERANCE = 0.10  # A rate more than 10% below the baseline is reported as a regression
+PACKAGES = ["numpy", "ecdsa", "coincurve", "bloom-filter", "psutil", "tqdm"]
+
+
+# Best of `repeats` runs of function(items); rates are items per second
+def measure(function, items, repeats=REPEATS):
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function(items)
+        best = min(best, time.perf_counter() - started)
+    return {"items": len(items), "seconds": best, "per_second": len(items) / best}
+
+
+def environment():
+    packages = {}
+    for name in PACKAGES:
+        try:
+            packages[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            packages[name] = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "hashlib_ripemd160": HASHLIB_RIPEMD160,
+        "selected_backend": get_backend().name,
+        "packages": packages,
+    }
+
+
+# Each step of private_key_to_hash160 on its own, scalar and vectorized
+def benchmark_stages(keys):
+    points = [jacobian_to_affine(jacobian_multiply_generator(key)) for key in keys]
+    pubkeys = [compress_point(point) for point in points]
+    sha256_digests = [hashlib.sha256(pubkey).digest() for pubkey in pubkeys]
+    digests = [ripemd160(digest) for digest in sha256_digests]
+    pubkey_array = to_array(pubkeys, 33)
+    sha256_array = sha256_batch(pubkey_array)
+    return {
+        "scalar_multiplication": measure(lambda items: [jacobian_to_affine(jacobian_multiply_generator(key))
+                                                        for key in items], keys),
+        "serialization": measure(lambda items: [compress_point(point) for point in items], points),
+        "sha256": measure(lambda items: [hashlib.sha256(pubkey).digest() for pubkey in items], pubkeys),
+        "ripemd160": measure(lambda items: [ripemd160(digest) for digest in items], sha256_digests),
+        "hex_encoding": measure(lambda items: [digest.hex() for digest in items], digests),
+        "sha256_numpy": measure(sha256_batch, pubkey_array),
+        "ripemd160_numpy": measure(ripemd160_batch, sha256_array),
+    }
+
+
+# Consecutive keys: one point addition per key instead of a scalar multiplication
+def benchmark_range_iterators(count):
+    last_key = FIRST_KEY + count - 1
+    return {
+        "affine_step": measure(lambda items: list(iterate_key_range(FIRST_KEY, last_key)), range(count)),
+        "batched": measure(lambda items: list(iterate_key_range_batched(FIRST_KEY, last_key)), range(count)),
+    }
+
+
+def benchmark_backends(keys):
+    results = {}
+    for backend_class in BACKENDS:
+        if not backend_class.available():
+            results[backend_class.name] = None
+            continue
+        backend = backend_class()
+        results[backend.name] = {
+            "single": measure(lambda items: [backend.hash160(key) for key in items], keys[:SINGLE_KEYS]),
+            "batch": measure(backend.hash160_batch, keys),
+        }
+    return results
+
+
+def benchmark_bloom_filter(keys):
+    if BloomFilter is None:
+        return None
+    prefixes = [digest.hex()[:PREFIX_LENGTH] for digest in get_backend().hash160_batch(keys)]
+    absent = [f"{index:x}"[-PREFIX_LENGTH:] + "z" for index in range(len(keys))]  # Never added
+
+    def add(items):
+        bloom_filter = BloomFilter(max_elements=len(items), error_rate=BLOOM_ERROR_RATE)
+        for item in items:
+            bloom_filter.add(item)
+
+    bloom_filter = BloomFilter(max_elements=len(prefixes), error_rate=BLOOM_ERROR_RATE)
+    for prefix in prefixes:
+        bloom_filter.add(prefix)
+    return {
+        "add": measure(add, prefixes),
+        "lookup_present": measure(lambda items: [item in bloom_filter for item in items], prefixes),
+        "lookup_absent": measure(lambda items: [item in bloom_filter for item in items], absent),
+    }
+
+
+# The same workload on the in-project filter, in bulk over raw digests
+def benchmark_blocked_bloom_filter(keys):
+    digests = to_array(get_backend().hash160_batch(keys), 20)
+    absent = digests ^ 0xFF  # Complemented digests: different prefixes, never added
+
+    def add(items):
+        BlockedBloomFilter(len(items), BLOOM_ERROR_RATE, PREFIX_LENGTH).add_many(items)
+
+    bloom_filter = BlockedBloomFilter(len(digests), BLOOM_ERROR_RATE, PREFIX_LENGTH)
+    bloom_filter.add_many(digests)
+    return {
+        "add": measure(add, digests),
+        "lookup_present": measure(bloom_filter.contains_many, digests),
+        "lookup_absent": measure(bloom_filter.contains_many, absent),
+        "lookup_single": measure(lambda items: [item in bloom_filter for item in items],
+                                 [digest.tobytes() for digest in digests]),
+    }
+
+
+# Hash one task's keys with the selected backend (module level so process pools can pickle it)
+def hash_task(keys):
+    return len(get_backend().hash160_batch(keys))
+
+
+# 1, 2, 4, ... workers, ending at the core count
+def worker_counts(cpu_count=None):
+    cpu_count = cpu_count or os.cpu_count()
+    counts = [1]
+    while counts[-1] * 2 < cpu_count:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpu_count:
+        counts.append(cpu_count)
+    return counts
+
+
+# Throughput of the selected backend in thread and process pools of each size
+def benchmark_workers(keys):
+    tasks = [keys[i:i + TASK_KEYS] for i in range(0, len(keys), TASK_KEYS)]
+    results = {"thread": {}, "process": {}}
+    for count in worker_counts():
+        for kind, pool in (("thread", ThreadPoolExecutor(count)), ("process", create_process_pool(count))):
+            with pool as executor:
+                list(executor.map(hash_task, tasks[:count]))  # Start every worker before timing
+                results[kind][str(count)] = measure(
+                    lambda items: sum(executor.map(hash_task, tasks)), keys)
+    return results
+
+
+def run_benchmarks(key_count=KEYS):
+    keys = [FIRST_KEY + 7919 * i for i in range(key_count)]  # Spread out, so no stage benefits from neighbours
+    results = {"environment": environment(), "settings": {"keys": key_count, "repeats": REPEATS}}
+    for name, benchmark, argument in (
+        ("stages", benchmark_stages, keys),
+        ("range_iterators", benchmark_range_iterators, key_count),
+        ("backends", benchmark_backends, keys),
+        ("bloom_filter", benchmark_bloom_filter, keys),
+        ("blocked_bloom_filter", benchmark_blocked_bloom_filter, keys),
+        ("workers", benchmark_workers, keys),
+    ):
+        print(f"Benchmarking {name}...", file=sys.stderr)
+        results[name] = benchmark(argument)
+    return results
+
+
+# Flatten results to {"stages.sha256": rate, ...}
+def rates(results, prefix=""):
+    flat = {}
+    for name, value in results.items():
+        if name in ("environment", "settings") or not isinstance(value, dict):
+            continue
+        if "per_second" in value:
+            flat[prefix + name] = value["per_second"]
+        else:
+            flat.update(rates(value, f"{prefix}{name}."))
+    return flat
+
+
+# Print the rate change of every measurement; returns the ones that regressed beyond the tolerance
+def compare(baseline, current, tolerance=REGRESSION_TOLERANCE):
+    old, new = rates(baseline), rates(current)
+    regressions = []
+    for name in sorted(old.keys() & new.keys()):
+        ratio = new[name] / old[name]
+        flag = ""
+        if ratio < 1 - tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:40s} {old[name]:14.1f} -> {new[name]:14.1f}/s  {100 * (ratio - 1):+7.1f}%{flag}")
+    for name in sorted(old.keys() ^ new.keys()):
+        print(f"{name:40s} only in {'baseline' if name in old else 'current'} results")
+    return regressions
+
+
+# Usage: python benchmark.py [output file] [keys]
+#        python benchmark.py compare <baseline.json> <current.json>  (exits 1 on a regression)
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "compare":
+        with open(sys.argv[2]) as f:
+            baseline = json.load(f)
+        with open(sys.argv[3]) as f:
+            current = json.load(f)
+        sys.exit(1 if compare(baseline, current) else 0)
+
+    output = sys.argv[1] if len(sys.argv) > 1 else BENCHMARK_FILE
+    results = run_benchmarks(int(sys.argv[2]) if len(sys.argv) > 2 else KEYS)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    for name, rate in rates(results).items():
+        print(f"{name:40s} {rate:14.1f}/s")
+    print(f"Results written to {output}.")
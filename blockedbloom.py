@@ -0,0 +1,272 @@
+import sys
+import math
+import struct
+import hashlib
+import numpy as np
+from hashbatch import to_array
+from matcher import HASH160_SIZE
+
+# Constants
+MAGIC = b"BBF2"  # BBF1 files tiled prefixes instead of hashing them
+HEADER_FORMAT = "<4sQQQdB"  # magic, blocks, capacity, count, error rate, prefix length (0: whole digest)
+HEADER_SIZE = 64  # The bit array starts on a cache line
+BLOCK_WORDS = 8  # 8 x 64 bits: one 64-byte cache line per block
+BLOCK_BITS = 64 * BLOCK_WORDS
+POSITION_BITS = 9  # log2(BLOCK_BITS)
+MAX_HASHES = 10  # 9-bit positions available in the 96 digest bits after the block index
+BUILD_BATCH = 1000000  # Digests added per batch when building from a file
+BLOCK_OVERSIZE = 1.15  # Extra bits making up for uneven block fill, so the measured rate stays under the target
+EXACT_PREFIX_LENGTH = 6  # Prefixes up to this many hex characters get an exact 16^L-bit bitmap (2 MB at 6)
+
+
+# Optimal bit count and hash count for n elements at false positive rate p
+def optimal_size(capacity, error_rate):
+    bits = math.ceil(-(capacity * math.log(error_rate)) / (math.log(2) ** 2))
+    hashes = max(1, min(MAX_HASHES, round(bits / capacity * math.log(2))))
+    return bits, hashes
+
+
+# The first prefix_length hex characters of each digest as an integer (prefix_length <= 16)
+def prefix_values(digests, prefix_length):
+    values = np.zeros(len(digests), dtype=np.uint64)
+    for i in range((prefix_length + 1) // 2):
+        values = (values << np.uint64(8)) | digests[:, i].astype(np.uint64)
+    return values >> np.uint64(4 * (prefix_length % 2))
+
+
+# Single-digest version of prefix_values
+def prefix_value(digest, prefix_length):
+    return int.from_bytes(digest[:(prefix_length + 1) // 2], "big") >> (4 * (prefix_length % 2))
+
+
+# BLAKE2b of a digest's prefix: 20 bytes whose block index and bit positions are independent of each other
+def mix_prefix(digest, prefix_length):
+    prefix = bytearray(digest[:(prefix_length + 1) // 2])
+    if prefix_length % 2:
+        prefix[-1] &= 0xF0
+    return hashlib.blake2b(bytes(prefix), digest_size=HASH160_SIZE).digest()
+
+
+def mix_prefixes(digests, prefix_length):
+    return to_array([mix_prefix(digest.tobytes(), prefix_length) for digest in digests], HASH160_SIZE)
+
+
+# (N, 20) uint8 array from an array, raw digests or hex strings
+def as_digest_array(digests):
+    if isinstance(digests, np.ndarray):
+        return np.ascontiguousarray(digests, dtype=np.uint8).reshape(-1, HASH160_SIZE)
+    return to_array([bytes.fromhex(d) if isinstance(d, str) else bytes(d) for d in digests], HASH160_SIZE)
+
+
+class BlockedBloomFilter:
+    """
+    Cache-line-blocked Bloom filter keyed by hash160 digests.
+
+    The digests are already uniformly random, so they are the hash functions:
+    bytes 0-7 pick a 512-bit block and bytes 8-19 give up to ten 9-bit bit
+    positions inside it. A lookup touches one cache line and never rehashes,
+    and add_many/contains_many do whole (N, 20) arrays in a few NumPy passes.
+
+    With prefix_length set (hex characters, as in TargetMatcher), only that
+    prefix counts, so keys that share it hit the same bits. A prefix of up to
+    EXACT_PREFIX_LENGTH characters indexes an exact 16^prefix_length-bit
+    bitmap (no false positives beyond the prefix itself); a longer one is
+    rehashed with BLAKE2b first, since a few prefix bytes cannot supply
+    independent block and bit positions on their own.
+
+    The bits live in a NumPy array or in a memory-mapped file. load() maps a
+    saved filter read-only without reading it, so a filter of hundreds of
+    millions of entries opens instantly and worker processes share its pages.
+    """
+
+    def __init__(self, capacity, error_rate, prefix_length=None, path=None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.prefix_length = prefix_length
+        bits, self.hashes = self._size()
+        self.blocks = max(1, -(-bits // BLOCK_BITS))
+        self.count = 0
+        self.path = path
+        self.writable = True
+        if path is None:
+            self.words = np.zeros(self.blocks * BLOCK_WORDS, dtype=np.uint64)
+        else:
+            with open(path, "wb") as f:
+                f.write(self._header())
+                f.truncate(HEADER_SIZE + self.blocks * BLOCK_BITS // 8)  # Sparse until bits are set
+            self.words = np.memmap(path, dtype=np.uint64, mode="r+", offset=HEADER_SIZE,
+                                   shape=(self.blocks * BLOCK_WORDS,))
+
+    # Bit count and hash count: one bit per possible prefix for an exact bitmap
+    def _size(self):
+        if self.exact:
+            return 16 ** self.prefix_length, 1
+        bits, hashes = optimal_size(self.capacity, self.error_rate)
+        return math.ceil(bits * BLOCK_OVERSIZE), hashes
+
+    @property
+    def exact(self):
+        return self.prefix_length is not None and self.prefix_length <= EXACT_PREFIX_LENGTH
+
+    def _header(self):
+        header = struct.pack(HEADER_FORMAT, MAGIC, self.blocks, self.capacity, self.count, self.error_rate,
+                             self.prefix_length or 0)
+        return header.ljust(HEADER_SIZE, b"\0")
+
+    # Map a saved filter; read-only unless writable=True
+    @classmethod
+    def load(cls, path, writable=False):
+        with open(path, "rb") as f:
+            magic, blocks, capacity, count, error_rate, prefix_length = struct.unpack_from(
+                HEADER_FORMAT, f.read(HEADER_SIZE))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a blocked Bloom filter")
+        bloom_filter = cls.__new__(cls)
+        bloom_filter.capacity = capacity
+        bloom_filter.error_rate = error_rate
+        bloom_filter.prefix_length = prefix_length or None
+        _, bloom_filter.hashes = bloom_filter._size()
+        bloom_filter.blocks = blocks
+        bloom_filter.count = count
+        bloom_filter.path = path
+        bloom_filter.writable = writable
+        bloom_filter.words = np.memmap(path, dtype=np.uint64, mode="r+" if writable else "r", offset=HEADER_SIZE,
+                                       shape=(blocks * BLOCK_WORDS,))
+        return bloom_filter
+
+    # Write the filter to a file (an in-memory one becomes file-backed only in the copy on disk)
+    def save(self, path=None):
+        path = path or self.path
+        if path == self.path and isinstance(self.words, np.memmap):
+            return self.flush()
+        with open(path, "wb") as f:
+            f.write(self._header())
+            self.words.tofile(f)
+
+    def flush(self):
+        if isinstance(self.words, np.memmap) and self.writable:
+            self.words.flush()
+            with open(self.path, "r+b") as f:
+                f.write(self._header())
+
+    # A file-backed filter is reopened from its file in spawned workers instead of being pickled
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if isinstance(self.words, np.memmap):
+            self.flush()
+            state["words"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.words is None:
+            self.words = np.memmap(self.path, dtype=np.uint64, mode="r", offset=HEADER_SIZE,
+                                   shape=(self.blocks * BLOCK_WORDS,))
+            self.writable = False
+
+    def __len__(self):
+        return self.count
+
+    # Word index and bit mask of each of the `hashes` bits for every digest
+    def _bits(self, digests):
+        digests = as_digest_array(digests)
+        if self.exact:
+            values = prefix_values(digests, self.prefix_length)
+            yield values >> np.uint64(6), np.uint64(1) << (values & np.uint64(63))
+            return
+        if self.prefix_length is not None:
+            digests = mix_prefixes(digests, self.prefix_length)
+        block = digests[:, 0:8].copy().view("<u8").ravel() % np.uint64(self.blocks)
+        low = digests[:, 8:16].copy().view("<u8").ravel()
+        high = digests[:, 16:20].copy().view("<u4").ravel().astype(np.uint64)
+        base = block * np.uint64(BLOCK_WORDS)
+        per_word = 64 // POSITION_BITS  # 7 positions from the low word, the rest from the high one
+        for i in range(self.hashes):
+            source, shift = (low, i) if i < per_word else (high, i - per_word)
+            position = (source >> np.uint64(POSITION_BITS * shift)) & np.uint64(BLOCK_BITS - 1)
+            yield base + (position >> np.uint64(6)), np.uint64(1) << (position & np.uint64(63))
+
+    def add_many(self, digests):
+        if not self.writable:
+            raise ValueError("Filter is mapped read-only")
+        digests = as_digest_array(digests)
+        for index, mask in self._bits(digests):
+            np.bitwise_or.at(self.words, index, mask)
+        self.count += len(digests)
+
+    # Boolean array: True where the digest may have been added
+    def contains_many(self, digests):
+        found = None
+        for index, mask in self._bits(digests):
+            hit = (self.words[index] & mask) != 0
+            found = hit if found is None else found & hit
+        return found
+
+    # The same bits as _bits for one digest, with plain ints: a single lookup skips the NumPy call overhead
+    def _bits_of(self, digest):
+        if isinstance(digest, str):
+            digest = bytes.fromhex(digest)
+        if self.exact:
+            value = prefix_value(digest, self.prefix_length)
+            yield value >> 6, value & 63
+            return
+        if self.prefix_length is not None:
+            digest = mix_prefix(digest, self.prefix_length)
+        base = int.from_bytes(digest[0:8], "little") % self.blocks * BLOCK_WORDS
+        low = int.from_bytes(digest[8:16], "little")
+        high = int.from_bytes(digest[16:20], "little")
+        per_word = 64 // POSITION_BITS
+        for i in range(self.hashes):
+            source, shift = (low, i) if i < per_word else (high, i - per_word)
+            position = (source >> (POSITION_BITS * shift)) & (BLOCK_BITS - 1)
+            yield base + (position >> 6), position & 63
+
+    def add(self, digest):
+        if not self.writable:
+            raise ValueError("Filter is mapped read-only")
+        for index, bit in self._bits_of(digest):
+            self.words[index] |= np.uint64(1 << bit)
+        self.count += 1
+
+    def __contains__(self, digest):
+        words = self.words
+        return all(int(words[index]) >> bit & 1 for index, bit in self._bits_of(digest))
+
+    # Expected false positive rate at the current fill: a lookup lands in a uniformly random block and needs
+    # all its bits set there, so average each block's fill^hashes (an exact bitmap has one bit: its fill)
+    def false_positive_rate(self):
+        fills = np.bitwise_count(self.words).reshape(-1, BLOCK_WORDS).sum(axis=1) / BLOCK_BITS
+        return float(np.mean(fills ** self.hashes))
+
+
+# Build a filter file from a file of hex hash160s (one per line), in batches
+def build_from_file(targets_path, filter_path, error_rate=0.001):
+    with open(targets_path) as f:
+        capacity = sum(1 for line in f if line.strip() and not line.startswith("#"))
+    bloom_filter = BlockedBloomFilter(max(capacity, 1), error_rate, path=filter_path)
+    with open(targets_path) as f:
+        batch = []
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                batch.append(bytes.fromhex(line))
+                if len(batch) == BUILD_BATCH:
+                    bloom_filter.add_many(batch)
+                    batch = []
+        if batch:
+            bloom_filter.add_many(batch)
+    bloom_filter.flush()
+    return bloom_filter
+
+
+# Usage: python blockedbloom.py build <targets file> <filter file> [error rate]
+#        python blockedbloom.py <filter file>  (prints the filter's parameters)
+if __name__ == "__main__":
+    if sys.argv[1] == "build":
+        bloom_filter = build_from_file(sys.argv[2], sys.argv[3], float(sys.argv[4]) if len(sys.argv) > 4 else 0.001)
+    else:
+        bloom_filter = BlockedBloomFilter.load(sys.argv[1])
+    print(f"{len(bloom_filter)} entries (capacity {bloom_filter.capacity}), {bloom_filter.blocks} blocks "
+          f"({bloom_filter.blocks * BLOCK_BITS // 8 / 2 ** 20:.1f} MB), {bloom_filter.hashes} hashes, "
+          f"prefix length {bloom_filter.prefix_length or 'full digest'}, "
+          f"expected false positive rate {bloom_filter.false_positive_rate():.2e}")
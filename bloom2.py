@@ -1,9 +1,12 @@
-import random
-import hashlib
-import os
-import pickle
-from concurrent.futures import ThreadPoolExecutor
-from main1 import private_key_to_hash160
+from functools import partial
+from checkpoint import Checkpoint
+from coverage_ledger import CoverageLedger, ledger_path
+from hash160_backend import iterate_hash160
+from matcher import EXACT_HIT, TargetMatcher
+from permutation import PermutationSampler
+from refinement import RefinementPlan
+from secp256k1 import iterate_segment
+from workerpool import create_process_pool, map_in_chunks
 
 # Constants
 MIN_KEY = 73786976294838206464
@@ -12,71 +15,89 @@ PREFIX = "739437"
 STEP_SIZE = 1234567890
 SAMPLES = 1000  # Number of random samples for initial search
 REFINE_STEP_SIZE = STEP_SIZE // 10  # Range for refinement around promising keys
-CHECKPOINT_FILE = "search_checkpoint.pkl"
-
-# Function to compute hash160 (replace with real implementation if needed)
-# def private_key_to_hash160(key):
-#     return hashlib.sha256(str(key).encode()).hexdigest()[:40]  # Mock hash160
+CHECKPOINT_FILE = "search_checkpoint.ckpt"
 
 # Save checkpoint to file
 def save_checkpoint(checkpoint_data):
-    with open(CHECKPOINT_FILE, "wb") as f:
-        pickle.dump(checkpoint_data, f)
+    checkpoint = Checkpoint(CHECKPOINT_FILE)
+    checkpoint.update("window", checkpoint_data["min_key"], checkpoint_data["max_key"])
+    checkpoint.update("sampled_keys", *checkpoint_data["sampled_keys"])
+    checkpoint.save()
     print(f"Checkpoint saved to {CHECKPOINT_FILE}.")
 
 # Load checkpoint from file
 def load_checkpoint():
-    if os.path.exists(CHECKPOINT_FILE):
-        with open(CHECKPOINT_FILE, "rb") as f:
-            checkpoint_data = pickle.load(f)
+    checkpoint = Checkpoint(CHECKPOINT_FILE)
+    window = checkpoint.get("window")
+    if window is not None:
         print(f"Checkpoint loaded from {CHECKPOINT_FILE}.")
-        return checkpoint_data
+        return {"min_key": window[0], "max_key": window[1], "sampled_keys": list(checkpoint.get("sampled_keys", ()))}
     return None
 
 # Random Sampling
 def search_with_sampling(target_prefix, min_key, max_key, samples=SAMPLES):
     """
     Perform a random search for keys matching the target prefix.
+    Keys come from a keyed permutation of the range, so no key is drawn twice, even across runs.
     """
     print(f"Starting random sampling in range [{min_key}, {max_key}] with {samples} samples.")
+    sampler = PermutationSampler.load(min_key, max_key)
     promising_keys = []
-    for _ in range(samples):
-        key = random.randint(min_key, max_key)
-        hash160 = private_key_to_hash160(key)
-        
+    for key, hash160 in iterate_hash160(sampler.draw(samples)):
         if hash160.startswith(target_prefix):
             print(f"Prefix match found: Key {key}, Hash160 {hash160}")
             promising_keys.append(key)
+    sampler.save()
     return promising_keys
 
+# Window refined around a key, clamped to the key range
+def refine_window(start_key, range_size=REFINE_STEP_SIZE):
+    return max(start_key - range_size, MIN_KEY), min(start_key + range_size, MAX_KEY)
+
+# Scan one interval of keys
+def refine_interval(interval, matcher):
+    for key, _, digest in iterate_segment(*interval):
+        match = matcher.match(digest)
+        
+        if match:
+            print(f"Refined match: Key {key}, Hash160 {digest.hex()}")
+            if match == EXACT_HIT:
+                print(f"Exact match found! Key: {key}")
+                return key
+    return None
+
 # Refinement Search
-def refine_search(start_key, target_prefix, target_hash160=None, range_size=REFINE_STEP_SIZE):
+def refine_search(start_key, matcher, range_size=REFINE_STEP_SIZE):
     """
     Refine the search around a specific key, looking for a closer match.
     """
     print(f"Refining search around key {start_key} with range size {range_size}.")
-    for key in range(max(start_key - range_size, MIN_KEY), 
-                     min(start_key + range_size, MAX_KEY) + 1):
-        hash160 = private_key_to_hash160(key)
-        
-        if hash160.startswith(target_prefix):
-            print(f"Refined match: Key {key}, Hash160 {hash160}")
-            if target_hash160 and hash160 == target_hash160:
-                print(f"Exact match found! Key: {key}")
-                return key
-    return None
+    return refine_interval(refine_window(start_key, range_size), matcher)
 
 # Parallel Search
-def parallel_refine_search(keys, target_prefix, target_hash160=None, max_workers=4):
+def parallel_refine_search(keys, matcher, max_workers=4):
     """
-    Refine search around multiple keys in parallel.
+    Refine search around multiple keys in parallel. Overlapping windows are merged, so each key is
+    hashed once, densest clusters go first, and keys already in the coverage ledger are skipped.
     """
-    print(f"Starting parallel refinement for {len(keys)} promising keys with {max_workers} workers.")
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        results = list(executor.map(
-            lambda key: refine_search(key, target_prefix, target_hash160),
-            keys
+    ledger = CoverageLedger(ledger_path(matcher.targets()))
+    plan = RefinementPlan(MIN_KEY, MAX_KEY, REFINE_STEP_SIZE)
+    plan.update(keys)
+    intervals = list(plan.stream(ledger, max_length=REFINE_STEP_SIZE))
+    print(f"Starting parallel refinement of {len(intervals)} unscanned intervals ({len(plan)} merged windows) "
+          f"around {len(keys)} promising keys with {max_workers} workers.")
+    with create_process_pool(max_workers) as executor:
+        results = list(map_in_chunks(
+            executor,
+            partial(refine_interval, matcher=matcher),
+            intervals,
+            chunksize=1,  # Each interval is up to REFINE_STEP_SIZE keys already
         ))
+
+    for interval, result in zip(intervals, results):
+        if result is None:
+            ledger.add(*interval)
+    ledger.save()
     return [res for res in results if res]
 
 # Main Function
@@ -90,7 +111,8 @@ def main():
         sampled_keys = search_with_sampling(PREFIX, MIN_KEY, MAX_KEY)
         save_checkpoint({"min_key": MIN_KEY, "max_key": MAX_KEY, "sampled_keys": sampled_keys})
 
-    results = parallel_refine_search(sampled_keys, PREFIX, target_hash160="739437bb3dd6d1983e66629c5f08c70e52769371")
+    matcher = TargetMatcher(["739437bb3dd6d1983e66629c5f08c70e52769371"], len(PREFIX))
+    results = parallel_refine_search(sampled_keys, matcher)
     
     if results:
         print(f"Found exact matches: {results}")
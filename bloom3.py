@@ -1,20 +1,17 @@
 import os
-import random
-import psutil
 import logging
+from functools import partial
 from tqdm import tqdm
+from cancellation import CancellationToken, Cancelled, cancel_executor, checked
+from coverage_ledger import CoverageLedger, ledger_path
 from concurrent.futures import ThreadPoolExecutor
-from main1 import private_key_to_hash160
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("search.log"),
-        logging.StreamHandler()
-    ]
-)
+from eventlog import EventLog, log_event
+from hash160_backend import iterate_hash160
+from matcher import EXACT_HIT
+from metrics import Metrics, record
+from permutation import PermutationSampler
+from secp256k1 import iterate_segment
+from workerpool import map_chunked, set_worker_state
 
 # Constants
 MIN_KEY = 73786976294838206464
@@ -25,6 +22,10 @@ GROWTH_FACTOR = 8
 MAX_SAMPLES = 1000000
 TARGET_PREFIX = "739437"
 TARGET_HASH160 = "739437bb3dd6d1983e66629c5f08c70e52769371"  # Replace with your actual target
+REFERENCE_HASH160 = False  # Scan segments with the ecdsa reference backend to cross-check the batched engine
+SEARCH_LOG = "search.jsonl"  # Structured event log, written off the hot path
+REFINE_CHUNK_SIZE = 1000  # Promising keys per refinement task
+REFINE_IN_FLIGHT = 2 * (os.cpu_count() or 1)  # Refinement tasks submitted ahead of the results being consumed
 
 # # Placeholder for actual hash160 function
 # def private_key_to_hash160(private_key):
@@ -34,33 +35,36 @@ TARGET_HASH160 = "739437bb3dd6d1983e66629c5f08c70e52769371"  # Replace with your
 # Monitoring resources
 def monitor_resources():
     """
-    Monitor and print current CPU and memory usage.
+    Live keys/s, hits, memory and CPU for the whole search: a summary line every
+    SUMMARY_INTERVAL seconds plus a Prometheus endpoint, fed by record() calls.
     """
-    memory = psutil.virtual_memory()
-    logging.info(f"Memory Usage: {memory.percent}%")
-    logging.info(f"CPU Usage: {psutil.cpu_percent()}%")
+    metrics = Metrics()
+    set_worker_state(metrics=metrics)  # record() in this process and its threads reports here
+    return metrics
 
 # Adaptive Sampling
 def adaptive_sampling(min_key, max_key, target_prefix, initial_samples=100, growth_factor=2, max_samples=10000):
     """
     Dynamically sample keys from the range without creating large sequences in memory.
+    Keys are drawn without replacement from a keyed permutation of the range that resumes across runs.
     """
     current_samples = initial_samples
     promising_keys = []
+    sampler = PermutationSampler.load(min_key, max_key)
 
     while current_samples <= max_samples:
-        logging.info(f"Sampling {current_samples} keys in range [{min_key}, {max_key}].")
-        sampled_keys = []
+        log_event("sampling_round", f"Sampling {current_samples} keys in range [{min_key}, {max_key}].",
+                  samples=current_samples)
+        sampled_keys = sampler.draw(current_samples)
         
-        for _ in range(current_samples):
-            # Randomly pick a number within the range without creating a huge list
-            sampled_keys.append(random.randint(min_key, max_key))
-        
-        for key in sampled_keys:
-            hash160 = private_key_to_hash160(key)
+        # Hash the sampled keys in vectorized batches
+        found_before = len(promising_keys)
+        for key, hash160 in iterate_hash160(sampled_keys):
             if hash160.startswith(target_prefix):
-                logging.info(f"Prefix match found: Key {key}, Hash160 {hash160}")
+                log_event("prefix_hit", f"Prefix match found: Key {key}, Hash160 {hash160}", key=key, hash160=hash160)
                 promising_keys.append(key)
+        sampler.save()
+        record(keys=len(sampled_keys), prefix_hits=len(promising_keys) - found_before)
         
         if promising_keys:
             logging.info(f"Found {len(promising_keys)} promising keys, increasing sample size.")
@@ -73,85 +77,102 @@ def adaptive_sampling(min_key, max_key, target_prefix, initial_samples=100, grow
 
 
 # Segment Refinement
-def segment_refinement(min_key, max_key, target_prefix, segment_size, target_hash160=None):
+def segment_refinement(min_key, max_key, matcher, segment_size, reference=REFERENCE_HASH160):
     """
     Split the range into segments and refine each segment without memory overflow.
+    Parts already in the coverage ledger are skipped, and finished segments are recorded.
     """
     logging.info(f"Segmenting range [{min_key}, {max_key}] with segment size {segment_size}.")
+    ledger = CoverageLedger(ledger_path(matcher.targets()))
+    logging.info(f"Already scanned: {100 * ledger.coverage(min_key, max_key):.6f}% of the range.")
     start = min_key
 
     while start <= max_key:
         end = min(start + segment_size - 1, max_key)
-        logging.info(f"Refining segment [{start}, {end}].")
-        
-        current_key = start
-        while current_key <= end:
-            hash160 = private_key_to_hash160(current_key)
-            if hash160.startswith(target_prefix):
-                logging.info(f"Prefix match found: Key {current_key}, Hash160 {hash160}")
-                if target_hash160 and hash160 == target_hash160:
-                    logging.info(f"Exact match found in segment! Key: {current_key}")
-                    return current_key
-            current_key += 1
+        for piece_start, piece_end in ledger.subtract(start, end):
+            log_event("segment", f"Refining segment [{piece_start}, {piece_end}].", start=piece_start, end=piece_end)
+            hits = 0
+            
+            for current_key, _, digest in iterate_segment(piece_start, piece_end, reference=reference):
+                match = matcher.match(digest)
+                if match:
+                    hits += 1
+                    log_event("prefix_hit", f"Prefix match found: Key {current_key}, Hash160 {digest.hex()}",
+                              key=current_key, hash160=digest.hex())
+                    if match == EXACT_HIT:
+                        logging.info(f"Exact match found in segment! Key: {current_key}")
+                        return current_key
+
+            ledger.add(piece_start, piece_end)
+            ledger.save()
+            record(keys=piece_end - piece_start + 1, prefix_hits=hits, ranges=1)
         
         start = end + 1
     return None
 
 
 # Parallel Refinement
-def refine_search(key, target_prefix, target_hash160):
+def refine_search(keys, target_prefix, target_hash160, token=None):
     """
-    Check a single key for prefix and exact match.
+    Check a chunk of keys for prefix and exact matches, hashing them in vectorized batches;
+    stops at the next batch once the token is cancelled.
     """
-    hash160 = private_key_to_hash160(key)
-    if hash160.startswith(target_prefix):
-        logging.info(f"Prefix match found: Key {key}, Hash160 {hash160}")
-        if target_hash160 and hash160 == target_hash160:
-            logging.info(f"Exact match found! Key: {key}")
-            return key
+    checked_keys = prefix_hits = 0
+    try:
+        for key, hash160 in checked(iterate_hash160(keys), token):
+            checked_keys += 1
+            if hash160.startswith(target_prefix):
+                prefix_hits += 1
+                log_event("prefix_hit", f"Prefix match found: Key {key}, Hash160 {hash160}", key=key, hash160=hash160)
+                if target_hash160 and hash160 == target_hash160:
+                    logging.info(f"Exact match found! Key: {key}")
+                    if token is not None:
+                        token.cancel()
+                    return key
+    except Cancelled:  # Another chunk found the key
+        pass
+    finally:
+        record(keys=checked_keys, prefix_hits=prefix_hits, ranges=1)
     return None
 
 def async_refinement_with_progress(keys, target_prefix, target_hash160=None):
     """
-    Asynchronously refine keys with progress tracking.
+    Asynchronously refine keys with progress tracking. Keys go out in chunks of REFINE_CHUNK_SIZE with at
+    most REFINE_IN_FLIGHT chunks outstanding, so memory stays flat however many keys there are.
     """
     results = []
-    chunk_size = 1000  # Process keys in chunks to avoid overloading memory
-    with ThreadPoolExecutor() as executor:
-        futures = []
-        for i in range(0, len(keys), chunk_size):
-            chunk = keys[i:i + chunk_size]
-            futures.extend(
-                executor.submit(refine_search, key, target_prefix, target_hash160) for key in chunk
-            )
-        
-        for future in tqdm(futures, desc="Refining keys"):
-            result = future.result()
+    token = CancellationToken()
+    with ThreadPoolExecutor() as executor, tqdm(total=len(keys), desc="Refining keys") as progress:
+        chunks = map_chunked(executor, partial(refine_search, target_prefix=target_prefix,
+                                               target_hash160=target_hash160, token=token),
+                             keys, REFINE_CHUNK_SIZE, REFINE_IN_FLIGHT, progress)
+        for _, result in chunks:
             if result:
                 results.append(result)
-                break  # Stop on first match
+                cancel_executor(executor, token)  # Stop on first match, dropping the queued chunks
+                break
     return results
 
 
 # Main Search Process
 def search_for_key():
-    # Step 1: Adaptive Sampling
-    promising_keys = adaptive_sampling(MIN_KEY, MAX_KEY, TARGET_PREFIX, INITIAL_SAMPLES, GROWTH_FACTOR, MAX_SAMPLES)
-    
-    if not promising_keys:
-        logging.info("No promising keys found during adaptive sampling.")
-        return
-
-    # Step 2: Parallel Refinement
-    logging.info("Starting parallel refinement.")
-    results = async_refinement_with_progress(promising_keys, TARGET_PREFIX, TARGET_HASH160)
-    
-    if results:
-        logging.info(f"Search completed. Matching key(s): {results}")
-    else:
-        logging.info("Search completed. No matching keys found.")
-
-    monitor_resources()
+    # Hot loops only queue their log records; a background thread writes them, rate-limited per event type
+    with EventLog(SEARCH_LOG, console_format="%(asctime)s - %(levelname)s - %(message)s"), monitor_resources():
+        # Step 1: Adaptive Sampling
+        promising_keys = adaptive_sampling(MIN_KEY, MAX_KEY, TARGET_PREFIX, INITIAL_SAMPLES, GROWTH_FACTOR, MAX_SAMPLES)
+        
+        if not promising_keys:
+            logging.info("No promising keys found during adaptive sampling.")
+            return
+
+        # Step 2: Parallel Refinement
+        logging.info("Starting parallel refinement.")
+        results = async_refinement_with_progress(promising_keys, TARGET_PREFIX, TARGET_HASH160)
+        
+        if results:
+            logging.info(f"Search completed. Matching key(s): {results}")
+        else:
+            logging.info("Search completed. No matching keys found.")
 
 # Run the search
 if __name__ == "__main__":
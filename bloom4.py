@@ -1,7 +1,12 @@
 import logging
-import random
-from concurrent.futures import ThreadPoolExecutor
-from main1 import private_key_to_hash160
+from functools import partial
+from coverage_ledger import CoverageLedger, ledger_path
+from hash160_backend import iterate_hash160
+from matcher import EXACT_HIT, TargetMatcher
+from permutation import KeyPermutation, PermutationSampler, sampling_budget
+from refinement import RefinementPlan
+from secp256k1 import iterate_segment
+from workerpool import create_process_pool, map_in_chunks
 
 # Logging Configuration
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
@@ -13,20 +18,21 @@ TARGET_HASH160 = "739437bb3dd6d1983e66629c5f08c70e52769371"
 TARGET_PREFIX = TARGET_HASH160[:6]  # First 3 bytes (6 hex chars)
 
 
-# Adaptive Sampling with Prefix Matching
-def adaptive_sampling(min_key, max_key, target_prefix, initial_samples=1000, growth_factor=2, max_samples=100000):
+# Adaptive Sampling with Prefix Matching; keys are drawn without replacement from a keyed
+# permutation of the range, starting at `counter`
+def adaptive_sampling(min_key, max_key, target_prefix, initial_samples=1000, growth_factor=2, max_samples=100000,
+                      permutation=None, counter=0):
+    permutation = permutation or KeyPermutation(min_key, max_key)
     current_samples = initial_samples
     promising_keys = []
 
     while current_samples <= max_samples:
         logging.info(f"Sampling {current_samples} keys in range [{min_key}, {max_key}].")
-        sampled_keys = set()
+        sampled_keys = permutation.keys(counter, current_samples)
+        counter += current_samples
 
-        for _ in range(current_samples):
-            sampled_keys.add(random.randint(min_key, max_key))
-
-        for key in sampled_keys:
-            hash160 = private_key_to_hash160(key)
+        # Hash the sampled keys in vectorized batches
+        for key, hash160 in iterate_hash160(sampled_keys):
             if hash160.startswith(target_prefix):
                 logging.info(f"Prefix match found: Key {key}, Hash160 {hash160}")
                 promising_keys.append(key)
@@ -40,32 +46,47 @@ def adaptive_sampling(min_key, max_key, target_prefix, initial_samples=1000, gro
 
     return promising_keys
 
-# Refining the Search Around Promising Keys
-def refine_search(min_key, max_key, promising_keys, target_hash160):
-    refined_keys = []
-    for key in promising_keys:
-        for offset in range(-1000, 1001):  # Narrow search window
-            test_key = key + offset
-            if min_key <= test_key <= max_key:
-                hash160 = private_key_to_hash160(test_key)
-                if hash160 == target_hash160:
-                    logging.info(f"Exact match found: Key {test_key}, Hash160 {hash160}")
+# Refining the Search Around Promising Keys: overlapping windows are merged so each key is hashed once,
+# densest clusters first, minus what was already scanned
+def refine_search(min_key, max_key, promising_keys, matcher, radius=1000):
+    ledger = CoverageLedger(ledger_path(matcher.targets()))
+    plan = RefinementPlan(min_key, max_key, radius)
+    plan.update(promising_keys)
+    logging.info(f"Refinement plan: {len(plan)} intervals, {plan.key_count()} keys.")
+    try:
+        for start_key, end_key in plan.stream(ledger):
+            for test_key, _, digest in iterate_segment(start_key, end_key):
+                if matcher.match(digest) == EXACT_HIT:
+                    logging.info(f"Exact match found: Key {test_key}, Hash160 {digest.hex()}")
                     return test_key  # Return immediately if found
-                elif hash160.startswith(TARGET_PREFIX):
-                    refined_keys.append(test_key)
+            ledger.add(start_key, end_key)
+    finally:
+        ledger.save()
     return None  # No exact match found
 
-# Parallel Sampling for Large Key Ranges
-def parallel_sampling(min_key, max_key, target_prefix, workers=4):
-    chunk_size = (max_key - min_key) // workers
-    ranges = [(min_key + i * chunk_size, min_key + (i + 1) * chunk_size - 1) for i in range(workers)]
+# Adaptive sampling over one worker's slice of the permutation's counters
+def sample_counter_slice(counter, permutation, target_prefix):
+    return adaptive_sampling(permutation.min_key, permutation.max_key, target_prefix,
+                             permutation=permutation, counter=counter)
 
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        results = executor.map(lambda r: adaptive_sampling(r[0], r[1], target_prefix), ranges)
+# Parallel Sampling for Large Key Ranges: every worker walks a disjoint slice of one permutation
+def parallel_sampling(min_key, max_key, target_prefix, workers=4):
+    sampler = PermutationSampler.load(min_key, max_key)
+    budget = sampling_budget(1000, 2, 100000)  # Counters one adaptive_sampling call may use
+    counters = [sampler.reserve(budget) for _ in range(workers)]
+
+    with create_process_pool(workers) as executor:
+        results = map_in_chunks(
+            executor,
+            partial(sample_counter_slice, permutation=sampler.permutation, target_prefix=target_prefix),
+            counters,
+            chunksize=1,  # One counter slice per worker
+        )
     
     promising_keys = []
     for result in results:
         promising_keys.extend(result)
+    sampler.save()
     return promising_keys
 
 # Main Execution Flow
@@ -78,7 +99,8 @@ def main():
         return
 
     logging.info(f"Refining search for {len(promising_keys)} promising keys.")
-    match = refine_search(MIN_KEY, MAX_KEY, promising_keys, TARGET_HASH160)
+    matcher = TargetMatcher([TARGET_HASH160], len(TARGET_PREFIX))
+    match = refine_search(MIN_KEY, MAX_KEY, promising_keys, matcher)
 
     if match:
         logging.info(f"Exact match found! Private key: {match}")
@@ -1,10 +1,11 @@
 # import os
 import logging
 # import numpy as np
-from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import time
-from main1 import private_key_to_hash160
-import random
+from hash160_backend import iterate_hash160
+from permutation import PermutationSampler
+from workerpool import chunk_size_for, create_process_pool, map_in_chunks
 
 # Constants
 MIN_KEY = 73786976294838206464
@@ -14,28 +15,17 @@ TARGET_PREFIX = TARGET_HASH160[:4]  # First few bytes of the target hash
 INITIAL_SAMPLES = 1000
 GROWTH_FACTOR = 2
 MAX_SAMPLES = 100000
-NUM_THREADS = 8  # Number of threads for parallel processing
+NUM_THREADS = 8  # Number of worker processes for parallel processing
 
 # Logging configuration
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
 
 
 
-# Generate random keys using numpy for efficiency
-# def generate_random_keys(min_key, max_key, num_keys):
-#     return np.random.randint(min_key, max_key + 1, size=num_keys, dtype=np.uint64)
-
-# Generate random keys using Python's `random` module to avoid NumPy's uint64 limitation
-def generate_random_keys(min_key, max_key, num_keys):
-    return [random.randint(min_key, max_key) for _ in range(num_keys)]
-
-
-
 # Check a batch of keys for matches with the target prefix
 def check_keys_for_prefix(keys, target_prefix):
     promising_keys = []
-    for key in keys:
-        hash160 = private_key_to_hash160(key)
+    for key, hash160 in iterate_hash160(keys):  # Hashed in vectorized batches
         if hash160.startswith(target_prefix):
             promising_keys.append((key, hash160))
     return promising_keys
@@ -44,15 +34,17 @@ def check_keys_for_prefix(keys, target_prefix):
 # Adaptive sampling with fast random generation and prefix matching
 def adaptive_sampling(min_key, max_key, target_prefix, initial_samples, growth_factor, max_samples):
     current_samples = initial_samples
+    sampler = PermutationSampler.load(min_key, max_key)
 
     while current_samples <= max_samples:
         logging.info(f"Sampling {current_samples} keys in range [{min_key}, {max_key}].")
 
-        # Generate a batch of random keys
-        sampled_keys = generate_random_keys(min_key, max_key, current_samples)
+        # Draw the next keys of a keyed permutation of the range: no repeats, even across attempts
+        sampled_keys = sampler.draw(current_samples)
 
         # Check for matches with the target prefix
         promising_keys = check_keys_for_prefix(sampled_keys, target_prefix)
+        sampler.save()
 
         if promising_keys:
             logging.info(f"Found {len(promising_keys)} promising keys. Expanding search.")
@@ -64,16 +56,23 @@ def adaptive_sampling(min_key, max_key, target_prefix, initial_samples, growth_f
     return []
 
 
+# Check a (key, hash160) pair against the target hash160
+def verify_key_pair(key_pair, target_hash160):
+    key, hash160 = key_pair
+    if hash160 == target_hash160:
+        return key
+    return None
+
+
 # Parallel verification of promising keys
 def verify_keys_parallel(promising_keys, target_hash160, num_threads):
-    def verify_key_pair(key_pair):
-        key, hash160 = key_pair
-        if hash160 == target_hash160:
-            return key
-        return None
-
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        results = executor.map(verify_key_pair, promising_keys)
+    with create_process_pool(num_threads) as executor:
+        results = map_in_chunks(
+            executor,
+            partial(verify_key_pair, target_hash160=target_hash160),
+            promising_keys,
+            chunksize=chunk_size_for(len(promising_keys), num_threads),
+        )
 
     for result in results:
         if result is not None:
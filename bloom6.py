@@ -1,8 +1,11 @@
 import logging
-import random
 from hashlib import sha256
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from main1 import private_key_to_hash160
+from functools import partial
+from tqdm import tqdm
+from eventlog import EventLog, log_event
+from hash160_backend import iterate_hash160
+from permutation import PermutationSampler
+from workerpool import chunk_size_for, create_process_pool, map_chunked
 
 # Constants
 TARGET_HASH160 = "739437bb3dd6d1983e66629c5f08c70e52769371"
@@ -12,55 +15,48 @@ PREFIX_LENGTH = 3  # Number of bytes to match in prefix
 INITIAL_SAMPLES = 1000
 GROWTH_FACTOR = 2
 MAX_SAMPLES = 512000
-NUM_THREADS = 8  # Number of parallel threads to use
+NUM_THREADS = 8  # Number of worker processes to use
+IN_FLIGHT = 2 * NUM_THREADS  # Chunks of keys submitted ahead of the results being consumed
 MATCH_THRESHOLD = 12  # Minimum matching indices to save range
-PREFIX_FILE = "prefixes.txt"  # File to store promising key ranges
-
-# Logging setup
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
-
-# Generate random keys using Python's `random` module
-def generate_random_keys(min_key, max_key, num_keys):
-    return [random.randint(min_key, max_key) for _ in range(num_keys)]
-
+PREFIX_FILE = "prefixes.jsonl"  # Every promising key range, one JSON object per line
 
 # Check how many indices match between two hash160 values
 def count_matching_indices(hash1, hash2):
     return sum(1 for a, b in zip(hash1, hash2) if a == b)
 
-# Check if a key's hash160 matches the target's prefix
-def matches_prefix(key, target_prefix):
-    hash160 = private_key_to_hash160(key)
-    return hash160.startswith(target_prefix), hash160
+# Check a chunk of keys, hashing them in vectorized batches; only the (key, hash160) prefix matches come back
+def matches_prefix_chunk(keys, target_prefix):
+    return [(key, hash160) for key, hash160 in iterate_hash160(keys) if hash160.startswith(target_prefix)]
 
-# Save promising ranges to a file
-def save_prefix_range(file_path, key_range):
-    with open(file_path, "a") as f:
-        f.write(f"{key_range}\n")
-    logging.info(f"Saved promising key range: {key_range}")
+# Record a promising range; the event log's writer thread appends it to PREFIX_FILE
+def save_prefix_range(key_range):
+    key, hash160 = key_range
+    log_event("promising_range", f"Saved promising key range: {key_range}", key=key, hash160=hash160)
 
 # Parallel prefix matching with index matching logic
 def parallel_matches_prefix(keys, target_prefix, target_hash160, num_threads):
     promising_keys = []
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        futures = {executor.submit(matches_prefix, key, target_prefix): key for key in keys}
-        for future in as_completed(futures):
-            key = futures[future]
-            is_prefix_match, hash160 = future.result()
-            if is_prefix_match:
+    # One task per chunk of keys, a bounded number outstanding; progress and results arrive per chunk
+    with create_process_pool(num_threads) as executor, tqdm(total=len(keys), desc="Matching prefixes") as progress:
+        chunks = map_chunked(executor, partial(matches_prefix_chunk, target_prefix=target_prefix), keys,
+                             chunk_size_for(len(keys), num_threads), IN_FLIGHT, progress)
+        for _, matches in chunks:
+            for key, hash160 in matches:
                 match_count = count_matching_indices(hash160, target_hash160)
                 if match_count > MATCH_THRESHOLD:
                     promising_keys.append(key)
-                    save_prefix_range(PREFIX_FILE, (key, hash160))
+                    save_prefix_range((key, hash160))
     return promising_keys
 
 # Adaptive sampling with parallelized prefix matching
 def adaptive_sampling(min_key, max_key, target_prefix, target_hash160, initial_samples, growth_factor, max_samples, num_threads):
     current_samples = initial_samples
+    sampler = PermutationSampler.load(min_key, max_key)  # Unique keys, resumed across attempts and runs
     while current_samples <= max_samples:
         logging.info(f"Sampling {current_samples} keys in range [{min_key}, {max_key}].")
-        sampled_keys = generate_random_keys(min_key, max_key, current_samples)
+        sampled_keys = sampler.draw(current_samples)
         promising_keys = parallel_matches_prefix(sampled_keys, target_prefix, target_hash160, num_threads)
+        sampler.save()
 
         if promising_keys:
             logging.info(f"Found promising keys: {promising_keys}")
@@ -74,8 +70,7 @@ def adaptive_sampling(min_key, max_key, target_prefix, target_hash160, initial_s
 
 # Verify if the full hash160 matches the target
 def verify_full_match(promising_keys, target_hash160):
-    for key in promising_keys:
-        hash160 = private_key_to_hash160(key)
+    for key, hash160 in iterate_hash160(promising_keys):
         if hash160 == target_hash160:
             logging.info(f"Found private key: {key}")
             return key
@@ -103,16 +98,18 @@ def find_private_key(target_hash160, min_key, max_key, initial_samples, growth_f
 
 # Execution
 if __name__ == "__main__":
-    private_key = find_private_key(
-        TARGET_HASH160, 
-        MIN_KEY, 
-        MAX_KEY, 
-        INITIAL_SAMPLES, 
-        GROWTH_FACTOR, 
-        MAX_SAMPLES, 
-        NUM_THREADS
-    )
-    if private_key:
-        logging.info(f"Success! Private key found: {private_key}")
-    else:
-        logging.info("Private key not found.")
+    # Promising ranges go to PREFIX_FILE in full; the console and events file are rate-limited
+    with EventLog(routes={"promising_range": PREFIX_FILE}):
+        private_key = find_private_key(
+            TARGET_HASH160, 
+            MIN_KEY, 
+            MAX_KEY, 
+            INITIAL_SAMPLES, 
+            GROWTH_FACTOR, 
+            MAX_SAMPLES, 
+            NUM_THREADS
+        )
+        if private_key:
+            logging.info(f"Success! Private key found: {private_key}")
+        else:
+            logging.info("Private key not found.")
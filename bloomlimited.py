@@ -1,9 +1,15 @@
+import time
 import random
-import hashlib
-from ecdsa import SigningKey, SECP256k1
-from bloom_filter import BloomFilter
-import math
-from concurrent.futures import ThreadPoolExecutor
+from cancellation import CancellationToken, Cancelled, cancel_executor, checked
+from checkpoint import Checkpoint
+from coverage_ledger import CoverageLedger, ledger_path
+from hash160_backend import get_backend
+from matcher import EXACT_HIT, TargetMatcher
+from metrics import Metrics, record
+from preload_cache import PreloadCache
+from rangesource import RangeSource
+from secp256k1 import iterate_key_range
+from workerpool import create_process_pool, get_worker_state, map_bounded, set_worker_state
 
 # Constants
 MIN_KEY = 73786976294838206464
@@ -12,81 +18,104 @@ STEP_SIZE = 1234567890
 PREFIX_LENGTH = 4  # Number of bytes to match in the prefix
 BLOOM_FILTER_SIZE = 500  # Reduced number of expected elements
 FALSE_POSITIVE_RATE = 0.05  # Increased false positive rate
-MAX_WORKERS = 8  # Number of threads for parallel processing
+MAX_WORKERS = 8  # Number of worker processes for parallel processing
+IN_FLIGHT = 4 * MAX_WORKERS  # Ranges submitted ahead of the results being consumed
+RANGE_CHECKPOINT = "bloomlimited_ranges.ckpt"  # Cursor of the next range, for resuming
 TARGET_HASH160 = "739437bb3dd6d1983e66629c5f08c70e52769371"  # Full hash to match
 
-# Function to generate hash160 from a private key
-def private_key_to_hash160(private_key):
-    pk_bytes = private_key.to_bytes(32, byteorder="big")
-    signing_key = SigningKey.from_string(pk_bytes, curve=SECP256k1)
-    verifying_key = signing_key.verifying_key
-    compressed_pubkey = (b'\x02' if verifying_key.to_string()[-1] % 2 == 0 else b'\x03') + verifying_key.to_string()[:32]
-    sha256 = hashlib.sha256(compressed_pubkey).digest()
-    ripemd160 = hashlib.new("ripemd160", sha256).digest()
-    return ripemd160.hex()
-
-# Create and initialize a Bloom filter
-def create_bloom_filter(size, false_positive_rate):
-    return BloomFilter(max_elements=size, error_rate=false_positive_rate)
-
 # Selective expansion within a specific range
-def selective_expansion(start_key, end_key, target_prefix):
+def selective_expansion(start_key, end_key, matcher, token=None):
     print(f"Expanding search in range: {start_key} to {end_key}")
-    for key in range(start_key, end_key + 1):
-        hash160 = private_key_to_hash160(key)
-        if hash160.startswith(target_prefix):  # Prefix match
-            print(f"Prefix match found: {key} -> {hash160}")
-            if hash160 == TARGET_HASH160:  # Exact match
-                print(f"Exact match found: {key} -> {hash160}")
+    for key, _, digest in checked(iterate_key_range(start_key, end_key), token):
+        match = matcher.match(digest)
+        if match:  # Prefix match
+            print(f"Prefix match found: {key} -> {digest.hex()}")
+            record(prefix_hits=1)
+            if match == EXACT_HIT:  # Exact match
+                print(f"Exact match found: {key} -> {digest.hex()}")
                 return key
     return None
 
-# Function to process a single range
-def process_range(start, end, target_prefix, bloom_filter):
+# Function to process a single range; returns (scanned in full, found key)
+def process_range(start, end, matcher, bloom_filter, token=None):
     # Check Bloom filter for this range
     sample_key = random.randint(start, end)
-    hash160_prefix = private_key_to_hash160(sample_key)[:len(target_prefix)]
+    digest = get_backend().hash160(sample_key)
 
-    if hash160_prefix in bloom_filter:
-        print(f"Potential match in range {start} to {end} (prefix: {hash160_prefix})")
+    if digest in bloom_filter:  # Looks up the digest's first prefix_length hex characters
+        print(f"Potential match in range {start} to {end} (prefix: {digest.hex()[:matcher.prefix_length]})")
         # Perform selective expansion if Bloom filter suggests a match
-        return selective_expansion(start, end, target_prefix)
-    return None
+        return True, selective_expansion(start, end, matcher, token)
+    return False, None
 
-# Parallel processing of ranges
-def search_with_parallelization(target_prefix):
-    print(f"Target prefix: {target_prefix}")
+# Worker initializer: keep the target matcher and Bloom filter in each worker process
+def init_worker(matcher, bloom_filter):
+    set_worker_state(matcher=matcher, bloom_filter=bloom_filter)
+
+# Process a (start, end) range inside a worker process; also report whether it was scanned in full
+def process_range_task(key_range):
+    start, end = key_range
+    token = get_worker_state("cancellation")
+    try:
+        scanned, result = process_range(start, end, get_worker_state("matcher"), get_worker_state("bloom_filter"), token)
+    except Cancelled:  # Another worker found the key
+        return key_range, False, None
+    if result:
+        token.cancel()  # Stop the other workers without waiting for the parent to see this result
+    record(keys=1 + (end - start + 1 if scanned else 0), ranges=1, covered=end - start + 1)
+    return key_range, scanned, result
 
-    # Step 1: Initialize the Bloom filter
-    bloom_filter = create_bloom_filter(size=BLOOM_FILTER_SIZE, false_positive_rate=FALSE_POSITIVE_RATE)
+# Parallel processing of ranges
+def search_with_parallelization(matcher):
+    print(f"Targets: {len(matcher)}, prefix length: {matcher.prefix_length}")
 
-    # Step 2: Preload Bloom filter with random samples
+    # Step 1-2: Bloom filter preloaded with random samples, built on the first run and then reused from disk
     print("Preloading Bloom filter with random samples...")
-    for _ in range(BLOOM_FILTER_SIZE):
-        random_key = random.randint(MIN_KEY, MAX_KEY)
-        hash160_prefix = private_key_to_hash160(random_key)[:len(target_prefix)]
-        bloom_filter.add(hash160_prefix)
+    started = time.perf_counter()
+    preload = PreloadCache(MIN_KEY, MAX_KEY)
+    bloom_filter = preload.bloom_filter(BLOOM_FILTER_SIZE, FALSE_POSITIVE_RATE, matcher.prefix_length)
+    print(f"Bloom filter ready in {time.perf_counter() - started:.3f}s")
 
     # Step 3: Parallel processing of ranges
     print("Starting parallel search...")
-    ranges = [(start, min(start + STEP_SIZE - 1, MAX_KEY)) for start in range(MIN_KEY, MAX_KEY, STEP_SIZE)]
+    ledger = CoverageLedger(ledger_path(matcher.targets()))
+    print(f"Already scanned: {100 * ledger.coverage(MIN_KEY, MAX_KEY):.6f}% of the key range")
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        results = executor.map(lambda r: process_range(r[0], r[1], target_prefix, bloom_filter), ranges)
+    token = CancellationToken()
+    with Checkpoint(RANGE_CHECKPOINT) as checkpoint:
+        # Ranges are generated lazily and resume from the saved cursor
+        ranges = RangeSource(MIN_KEY, MAX_KEY, STEP_SIZE, ledger, checkpoint)
+        print(f"Starting at key {ranges.cursor} ({100 * ranges.progress():.6f}% of the key range done)")
+        metrics = Metrics(total=MAX_KEY - MIN_KEY + 1, completed=ranges.cursor - MIN_KEY, slots=MAX_WORKERS + 1,
+                          report=print)
+        metrics.gauge("queue_depth", lambda: (MAX_KEY - ranges.cursor) // STEP_SIZE + 1)  # Ranges still to scan
+        metrics.gauge("checkpoint_seconds", lambda: checkpoint.save_seconds)
+        with metrics, create_process_pool(MAX_WORKERS, initializer=init_worker, initargs=(matcher, bloom_filter),
+                                          cancellation=token, metrics=metrics) as executor:
+            results = map_bounded(executor, process_range_task, ranges, IN_FLIGHT)
 
-    # Step 4: Check results for any found keys
-    for result in results:
-        if result:
-            print(f"Found key: {result}")
-            return result
+            # Step 4: Record fully scanned ranges and check results for any found keys
+            try:
+                for (start, end), scanned, result in results:
+                    if result:
+                        print(f"Found key: {result}")
+                        return result
+                    if scanned:
+                        ledger.add(start, end)
+                    if not token.cancelled():  # Cancelled ranges were not checked
+                        ranges.advance(end)
+            finally:
+                # Found, interrupted or done: stop the ranges still running or queued instead of waiting for them
+                cancel_executor(executor, token)
+                ledger.save()
 
     print("No matching key found.")
     return None
 
 # Usage
 if __name__ == "__main__":
-    target_prefix = TARGET_HASH160[:PREFIX_LENGTH]  # Example target prefix
-    found_key = search_with_parallelization(target_prefix)
+    matcher = TargetMatcher([TARGET_HASH160], PREFIX_LENGTH)  # Add more target hash160s as needed
+    found_key = search_with_parallelization(matcher)
     if found_key:
         print(f"Found key: {found_key}")
     else:
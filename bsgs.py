@@ -0,0 +1,159 @@
+import os
+import sys
+import math
+import logging
+import numpy as np
+from functools import partial
+from secp256k1 import P, decode_pubkey, iterate_point_batches, point_add, point_multiply
+from workerpool import create_process_pool, get_worker_state, map_bounded, map_in_chunks, set_worker_state
+
+# Constants
+MIN_KEY = 73786976294838206464
+MAX_KEY = 147573952589676412927
+MAX_BABY_STEPS = 2 ** 28  # Cap on the baby-step table, which takes 16 bytes per entry on disk (4 GiB here)
+TABLE_DIR = "bsgs_tables"
+BUILD_CHUNK = 2 ** 18  # Baby steps computed per worker task while building the table
+GIANT_STEPS_PER_TASK = 2 ** 14  # Giant steps walked per worker task
+LOOKUP_BATCH = 4096  # Giant-step fingerprints looked up in the table at once
+MAX_WORKERS = os.cpu_count()
+IN_FLIGHT = 4 * MAX_WORKERS  # Giant-step tasks submitted ahead of the results being consumed
+FINGERPRINT_MASK = (1 << 64) - 1  # Fingerprint: the low 64 bits of the x coordinate
+TABLE_DTYPE = np.dtype([("fingerprint", "<u8"), ("step", "<u8")])
+
+# Logging configuration
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+
+# Path of the baby-step table for a given number of baby steps
+def table_path(baby_steps):
+    return os.path.join(TABLE_DIR, f"baby_steps_{baby_steps}.npy")
+
+
+# Fingerprints of j*G for j in [first, last]
+def baby_step_chunk(bounds):
+    first, last = bounds
+    fingerprints = np.empty(last - first + 1, dtype=np.uint64)
+    index = 0
+    for _, points in iterate_point_batches(first, last):
+        fingerprints[index:index + len(points)] = [x & FINGERPRINT_MASK for x, _ in points]
+        index += len(points)
+    return first, fingerprints
+
+
+# Build the sorted baby-step table for j*G, j = 1..baby_steps, or reuse an existing one
+def build_baby_step_table(baby_steps, max_workers=MAX_WORKERS):
+    """
+    The table is a memory-mapped .npy file of (fingerprint, step) records
+    sorted by fingerprint. It does not depend on the public key or the key
+    range, so one table serves every search with the same baby_steps.
+    """
+    path = table_path(baby_steps)
+    if os.path.exists(path):
+        return path
+    os.makedirs(TABLE_DIR, exist_ok=True)
+    partial_path = path + ".partial"
+    table = np.lib.format.open_memmap(partial_path, mode="w+", dtype=TABLE_DTYPE, shape=(baby_steps,))
+
+    logging.info(f"Building baby-step table with {baby_steps} entries in {path}.")
+    chunks = [(first, min(first + BUILD_CHUNK - 1, baby_steps)) for first in range(1, baby_steps + 1, BUILD_CHUNK)]
+    with create_process_pool(max_workers) as executor:
+        for first, fingerprints in map_in_chunks(executor, baby_step_chunk, chunks, chunksize=1):
+            rows = slice(first - 1, first - 1 + len(fingerprints))
+            table["fingerprint"][rows] = fingerprints
+            table["step"][rows] = np.arange(first, first + len(fingerprints), dtype=np.uint64)
+
+    table.sort(order="fingerprint")
+    table.flush()
+    del table
+    os.replace(partial_path, path)
+    return path
+
+
+# Worker initializer: map the baby-step table read-only, shared through the page cache
+def open_table(path):
+    table = np.load(path, mmap_mode="r")
+    set_worker_state(fingerprints=table["fingerprint"], steps=table["step"], baby_steps=len(table))
+
+
+# Look up a batch of giant-step fingerprints; return the matching private key, if any
+def lookup_giant_steps(batch, target, base_key):
+    fingerprints = get_worker_state("fingerprints")
+    steps = get_worker_state("steps")
+    baby_steps = get_worker_state("baby_steps")
+    values = np.array([fingerprint for _, fingerprint in batch], dtype=np.uint64)
+    positions = np.searchsorted(fingerprints, values)
+    for (giant_step, fingerprint), position in zip(batch, positions.tolist()):
+        while position < len(fingerprints) and int(fingerprints[position]) == fingerprint:
+            # x(jG) == x(-jG), so a hit means the key is base + i*m + j or base + i*m - j
+            step = int(steps[position])
+            for key in (base_key + giant_step * baby_steps + step, base_key + giant_step * baby_steps - step):
+                if key > 0 and point_multiply(key) == target:
+                    return key
+            position += 1
+    return None
+
+
+# Walk giant steps [first, last]: R_i = Q - (base_key + i*m)G, looking each R_i up in the table
+def giant_step_chunk(bounds, target, base_key):
+    first, last = bounds
+    baby_steps = get_worker_state("baby_steps")
+    stride_x, stride_y = point_multiply(baby_steps)
+    stride = (stride_x, P - stride_y)  # -m*G
+    start_x, start_y = point_multiply(base_key + first * baby_steps)
+    point = point_add(target, (start_x, P - start_y))
+
+    batch = []
+    for giant_step in range(first, last + 1):
+        if point is None:  # Q is exactly (base_key + i*m)G
+            return base_key + giant_step * baby_steps
+        batch.append((giant_step, point[0] & FINGERPRINT_MASK))
+        if len(batch) == LOOKUP_BATCH:
+            found = lookup_giant_steps(batch, target, base_key)
+            if found is not None:
+                return found
+            batch = []
+        point = point_add(point, stride)
+    return lookup_giant_steps(batch, target, base_key) if batch else None
+
+
+# Baby steps for a range: about its square root, so table size and giant steps balance, within MAX_BABY_STEPS
+def baby_steps_for(min_key, max_key):
+    baby_steps = math.isqrt(max_key - min_key + 1)
+    if baby_steps > MAX_BABY_STEPS:
+        logging.info(f"Capping the baby-step table at {MAX_BABY_STEPS} entries (the range wants {baby_steps}); "
+                     f"the search takes {baby_steps // MAX_BABY_STEPS}x more giant steps instead.")
+        return MAX_BABY_STEPS
+    return baby_steps
+
+
+# Baby-step giant-step search for the private key of a known public key in [min_key, max_key]
+def search_with_bsgs(pubkey, min_key=MIN_KEY, max_key=MAX_KEY, baby_steps=None, max_workers=MAX_WORKERS):
+    target = decode_pubkey(pubkey)
+    baby_steps = baby_steps or baby_steps_for(min_key, max_key)
+    path = build_baby_step_table(baby_steps, max_workers)
+
+    giant_steps = (max_key - min_key) // baby_steps + 1
+    logging.info(f"Searching [{min_key}, {max_key}] with {giant_steps} giant steps of {baby_steps} keys.")
+    # Chunks are cut only as tasks are submitted; the default range has far too many to list
+    chunks = ((first, min(first + GIANT_STEPS_PER_TASK, giant_steps) - 1)
+              for first in range(0, giant_steps, GIANT_STEPS_PER_TASK))
+    with create_process_pool(max_workers, initializer=open_table, initargs=(path,)) as executor:
+        results = map_bounded(executor, partial(giant_step_chunk, target=target, base_key=min_key), chunks, IN_FLIGHT)
+        for result in results:
+            if result is not None and min_key <= result <= max_key:
+                logging.info(f"Private key found: {result}")
+                executor.shutdown(wait=False, cancel_futures=True)
+                return result
+
+    logging.info("Private key not found in range.")
+    return None
+
+
+# Usage: python bsgs.py <pubkey hex> [min_key] [max_key]
+if __name__ == "__main__":
+    pubkey = sys.argv[1]
+    min_key = int(sys.argv[2]) if len(sys.argv) > 2 else MIN_KEY
+    max_key = int(sys.argv[3]) if len(sys.argv) > 3 else MAX_KEY
+    private_key = search_with_bsgs(pubkey, min_key, max_key)
+    if private_key:
+        logging.info(f"Success! Private key found: {private_key}")
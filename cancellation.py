@@ -0,0 +1,50 @@
+from secp256k1 import BATCH_SIZE
+from workerpool import get_context
+
+# Constants
+CHECK_INTERVAL = BATCH_SIZE  # Keys between cancellation checks: one EC batch, so checks cost nothing measurable
+
+
+class Cancelled(Exception):
+    """Raised inside a scan once its cancellation token has been set."""
+
+
+class CancellationToken:
+    """
+    One flag shared by every thread and worker process of a search. It wraps a
+    multiprocessing Event, so it reaches pool workers through the pool
+    initializer (create_process_pool(..., cancellation=token)) rather than as a
+    task argument. Whoever finds the key cancels it; scanners check it at
+    batch boundaries and raise Cancelled, which stops in-flight work within
+    one batch instead of at the end of its range.
+    """
+
+    def __init__(self):
+        self.event = get_context().Event()
+
+    def cancel(self):
+        self.event.set()
+
+    def cancelled(self):
+        return self.event.is_set()
+
+    def check(self):
+        if self.event.is_set():
+            raise Cancelled
+
+
+# Yield the items, raising Cancelled at the next batch boundary after the token is set
+def checked(items, token, interval=CHECK_INTERVAL):
+    if token is None:
+        yield from items
+        return
+    for count, item in enumerate(items):
+        if count % interval == 0:
+            token.check()
+        yield item
+
+
+# Stop a search on the first exact hit: cancel running tasks and drop the ones still queued
+def cancel_executor(executor, token):
+    token.cancel()
+    executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+import zlib
+import signal
+
+# Constants
+MAGIC = b"CKPT"
+VERSION = 1
+SAVE_INTERVAL = 10  # Seconds between saves while cursors keep changing
+SAVE_WORK = None  # Or save after this much reported work (e.g. keys checked)
+
+
+# Zigzag-encoded LEB128 varint, so any int (including negative steps) fits
+def _encode_int(value, out):
+    value = value * 2 if value >= 0 else -value * 2 - 1
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _decode_int(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        value |= (byte & 0x7F) << shift
+        offset += 1
+        if byte < 0x80:
+            break
+        shift += 7
+    return (value >> 1) if value % 2 == 0 else -(value >> 1) - 1, offset
+
+
+def encode_cursors(cursors):
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    _encode_int(len(cursors), out)
+    for name, values in cursors.items():
+        encoded_name = name.encode()
+        _encode_int(len(encoded_name), out)
+        out += encoded_name
+        _encode_int(len(values), out)
+        for value in values:
+            _encode_int(value, out)
+    out += zlib.crc32(out).to_bytes(4, "little")
+    return bytes(out)
+
+
+def decode_cursors(data):
+    if data[:4] != MAGIC:
+        raise ValueError("Not a checkpoint file")
+    if data[4] != VERSION:
+        raise ValueError(f"Unsupported checkpoint version {data[4]}")
+    if zlib.crc32(data[:-4]) != int.from_bytes(data[-4:], "little"):
+        raise ValueError("Checkpoint checksum mismatch")
+    cursors = {}
+    count, offset = _decode_int(data, 5)
+    for _ in range(count):
+        length, offset = _decode_int(data, offset)
+        name = data[offset:offset + length].decode()
+        offset += length
+        size, offset = _decode_int(data, offset)
+        values = []
+        for _ in range(size):
+            value, offset = _decode_int(data, offset)
+            values.append(value)
+        cursors[name] = tuple(values)
+    return cursors
+
+
+class Checkpoint:
+    """
+    Named integer cursors (a search frontier, a sampler counter, one cursor per
+    worker, ...) saved to a small versioned, checksummed binary file.
+
+    update() only records the new values and saves when SAVE_INTERVAL seconds
+    or `save_work` units of work have passed, so it is cheap enough to call
+    every batch. Saves write a temporary file, fsync it and rename it over the
+    old one, so a crash leaves either the old or the new checkpoint. Used as a
+    context manager, it also flushes on SIGTERM/SIGINT before exiting.
+    """
+
+    def __init__(self, path, save_interval=SAVE_INTERVAL, save_work=SAVE_WORK):
+        self.path = path
+        self.save_interval = save_interval
+        self.save_work = save_work
+        self.cursors = self._read()
+        self.dirty = False
+        self.last_save = time.monotonic()
+        self.work = 0
+        self.save_seconds = 0.0  # Duration of the last save
+        self._owner = os.getpid()
+        self._previous_handlers = {}
+        self._saving = False
+        self._pending_signal = None
+
+    def _read(self):
+        try:
+            with open(self.path, "rb") as f:
+                return decode_cursors(f.read())
+        except FileNotFoundError:
+            return {}
+
+    def get(self, name, default=None):
+        return self.cursors.get(name, default)
+
+    # Record new cursor values; saves only when the time or work interval is due
+    def update(self, name, *values, work=0):
+        self.cursors[name] = tuple(values)
+        self.dirty = True
+        self.work += work
+        if (time.monotonic() - self.last_save >= self.save_interval
+                or (self.save_work is not None and self.work >= self.save_work)):
+            self.save()
+
+    def remove(self, name):
+        if self.cursors.pop(name, None) is not None:
+            self.dirty = True
+
+    # Write the cursors atomically: temporary file, fsync, rename, fsync the directory
+    def save(self):
+        self._saving = True
+        started = time.monotonic()
+        try:
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(encode_cursors(self.cursors))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.path)
+            directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+            self.dirty = False
+            self.last_save = time.monotonic()
+            self.save_seconds = self.last_save - started
+            self.work = 0
+        finally:
+            self._saving = False
+        if self._pending_signal is not None:  # A signal arrived mid-save; this save was the flush
+            self._exit_for(self._pending_signal)
+
+    def flush(self):
+        if self.dirty:
+            self.save()
+
+    def _exit_for(self, signum):
+        self._pending_signal = None
+        if signum == signal.SIGINT:
+            raise KeyboardInterrupt
+        sys.exit(128 + signum)
+
+    def _handle_signal(self, signum, frame):
+        if self._saving:
+            self._pending_signal = signum
+            return
+        # Forked workers inherit the handler; only the process that owns the checkpoint writes it
+        if os.getpid() == self._owner:
+            self.flush()
+        self._exit_for(signum)
+
+    def __enter__(self):
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self._previous_handlers[signum] = signal.signal(signum, self._handle_signal)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+        for signum, handler in self._previous_handlers.items():
+            signal.signal(signum, handler)
+        self._previous_handlers.clear()
+        return False
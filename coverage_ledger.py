@@ -0,0 +1,147 @@
+import os
+import sys
+import fcntl
+import hashlib
+from bisect import bisect_left, bisect_right
+
+# Constants
+COVERAGE_FILE = "coverage_{}.bin"  # One ledger per target set, named by a digest of the targets
+MAGIC = b"COV1"
+
+
+# Ledger file for a set of targets (hex strings or raw digests): a range scanned for other targets is not covered
+def ledger_path(targets):
+    digests = sorted({bytes.fromhex(t) if isinstance(t, str) else bytes(t) for t in targets})
+    return COVERAGE_FILE.format(hashlib.sha256(b"".join(digests)).hexdigest()[:16])
+
+
+# Unsigned LEB128 varint, any size
+def _encode_varint(value, out):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _decode_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        value |= (byte & 0x7F) << shift
+        offset += 1
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class CoverageLedger:
+    """
+    Set of scanned key intervals, kept as sorted disjoint closed intervals
+    [start, end]. Inserting merges overlapping and adjacent intervals. On disk
+    the set is run-length encoded as varint (gap, length) pairs, so a ledger
+    of a few thousand intervals over 2^66-wide ranges stays a few kilobytes.
+    Saving takes a file lock and merges what other processes saved meanwhile.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.starts = []
+        self.ends = []
+        self.load()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends)
+
+    # Record [start, end] as scanned
+    def add(self, start, end):
+        if start > end:
+            return
+        # Every interval that overlaps or touches [start, end] is folded into it
+        first = bisect_left(self.ends, start - 1)
+        last = bisect_right(self.starts, end + 1)
+        if first < last:
+            start = min(start, self.starts[first])
+            end = max(end, self.ends[last - 1])
+        self.starts[first:last] = [start]
+        self.ends[first:last] = [end]
+
+    # Parts of [start, end] not yet scanned, in order
+    def subtract(self, start, end):
+        missing = []
+        index = bisect_left(self.ends, start)
+        while start <= end:
+            if index == len(self.starts) or self.starts[index] > end:
+                missing.append((start, end))
+                break
+            if self.starts[index] > start:
+                missing.append((start, self.starts[index] - 1))
+            start = self.ends[index] + 1
+            index += 1
+        return missing
+
+    def is_covered(self, start, end):
+        return not self.subtract(start, end)
+
+    # Number of scanned keys in [start, end]
+    def covered_count(self, start, end):
+        return (end - start + 1) - sum(last - first + 1 for first, last in self.subtract(start, end))
+
+    # Scanned fraction of [start, end]
+    def coverage(self, start, end):
+        return self.covered_count(start, end) / (end - start + 1)
+
+    def _read(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        if data[:4] != MAGIC:
+            raise ValueError(f"{self.path} is not a coverage ledger")
+        count, offset = _decode_varint(data, 4)
+        intervals = []
+        previous_end = -1
+        for _ in range(count):
+            gap, offset = _decode_varint(data, offset)
+            length, offset = _decode_varint(data, offset)
+            start = previous_end + 1 + gap
+            previous_end = start + length
+            intervals.append((start, previous_end))
+        return intervals
+
+    # Merge the intervals saved on disk into this ledger
+    def load(self):
+        for start, end in self._read():
+            self.add(start, end)
+
+    # Merge with the file under an exclusive lock, then replace it atomically
+    def save(self):
+        with open(self.path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.load()
+            out = bytearray(MAGIC)
+            _encode_varint(len(self.starts), out)
+            previous_end = -1
+            for start, end in zip(self.starts, self.ends):
+                _encode_varint(start - previous_end - 1, out)
+                _encode_varint(end - start, out)
+                previous_end = end
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(out)
+            os.replace(temporary, self.path)
+
+
+# Usage: python coverage_ledger.py <min_key> <max_key> <target hash160> [target hash160 ...]
+if __name__ == "__main__":
+    min_key, max_key = int(sys.argv[1]), int(sys.argv[2])
+    ledger = CoverageLedger(ledger_path(sys.argv[3:]))
+    print(f"{len(ledger)} intervals, {ledger.covered_count(min_key, max_key)} keys scanned "
+          f"({100 * ledger.coverage(min_key, max_key):.6f}% of [{min_key}, {max_key}])")
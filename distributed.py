@@ -0,0 +1,299 @@
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import importlib
+import threading
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+from cancellation import CancellationToken, Cancelled, checked
+from coverage_ledger import CoverageLedger, ledger_path
+from matcher import EXACT_HIT, TargetMatcher
+from secp256k1 import iterate_key_range
+from workerpool import create_process_pool, get_worker_state, map_in_chunks
+from workqueue import WorkQueue
+
+# Constants
+MIN_KEY = 73786976294838206464
+MAX_KEY = 147573952589676412927
+STEP_SIZE = 2 ** 20  # Keys per leased range
+TARGET_HASH160S = ["739437bb3dd6d1983e66629c5f08c70e52769371"]
+PREFIX_LENGTH = 6  # Hex characters reported back as prefix hits
+COORDINATOR_PORT = 8765
+QUEUE_FILE = "coordinator_queue.sqlite"
+LEASE_SECONDS = 300  # Leases expire unless a heartbeat renews them
+HEARTBEAT_INTERVAL = 30  # Seconds between worker heartbeats
+REQUEST_RETRIES = 5  # Attempts per request before a worker gives up on the coordinator
+QUEUE_CHUNK = 2 ** 16  # Ranges queued at a time as the queue runs low
+
+# Logging configuration
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+
+class Coordinator:
+    """
+    Owns [min_key, max_key]: queues it as leased ranges, renews leases on
+    worker heartbeats, records completed ranges in the coverage ledger and
+    keeps prefix/exact hits next to the queue. All calls hold one lock, since
+    request handler threads share the queue's SQLite connection.
+    """
+
+    def __init__(self, min_key, max_key, step_size, targets, prefix_length, queue_path=QUEUE_FILE,
+                 lease_seconds=LEASE_SECONDS):
+        self.targets = list(targets)
+        self.prefix_length = prefix_length
+        self.lock = threading.Lock()
+        self.queue = WorkQueue(queue_path, lease_seconds)
+        self.ledger = CoverageLedger(ledger_path(self.targets))
+        self.workers = {}  # Worker name -> time of its last request
+        self.queue.connection.execute(
+            "CREATE TABLE IF NOT EXISTS hits (worker TEXT, key TEXT, hash160 TEXT, exact INTEGER, reported REAL)"
+        )
+        self.queue.connection.execute(
+            "CREATE TABLE IF NOT EXISTS search (min_key TEXT, max_key TEXT, step_size TEXT, next_key TEXT)"
+        )
+        row = self.queue.connection.execute("SELECT min_key, max_key, step_size, next_key FROM search").fetchone()
+        if row is None:
+            self.queue.connection.execute("INSERT INTO search VALUES (?, ?, ?, ?)",
+                                          (str(min_key), str(max_key), str(step_size), str(min_key)))
+            row = (min_key, max_key, step_size, min_key)
+        self.min_key, self.max_key, self.step_size, self.next_key = map(int, row)
+
+    # Queue the next chunk of ranges (minus ledger coverage) when the queue runs low
+    def _refill(self):
+        if self.next_key > self.max_key or self.queue.has_pending():
+            return
+        last = min(self.next_key + QUEUE_CHUNK * self.step_size - 1, self.max_key)
+        self.queue.enqueue(piece for start in range(self.next_key, last + 1, self.step_size)
+                           for piece in self.ledger.subtract(start, min(start + self.step_size - 1, last)))
+        self.next_key = last + 1
+        self.queue.connection.execute("UPDATE search SET next_key = ?", (str(self.next_key),))
+
+    def _seen(self, worker):
+        self.workers[worker] = time.time()
+
+    def config(self):
+        return {"targets": self.targets, "prefix_length": self.prefix_length, "heartbeat_interval": HEARTBEAT_INTERVAL}
+
+    def lease(self, worker, count=1):
+        with self.lock:
+            self._seen(worker)
+            found = self._found()
+            if found is not None:  # Nothing left to hand out once the key is known
+                return {"leases": [], "found": found}
+            self._refill()
+            leases = self.queue.lease(worker, count)
+            return {"leases": [[range_id, str(start), str(end)] for range_id, start, end in leases], "found": None}
+
+    def heartbeat(self, worker, range_ids):
+        with self.lock:
+            self._seen(worker)
+            renewed = [range_id for range_id in range_ids if self.queue.renew(range_id, worker)]
+            return {"renewed": renewed, "found": self._found()}
+
+    def complete(self, worker, range_id, start, end, key=None):
+        with self.lock:
+            self._seen(worker)
+            self.queue.complete(range_id, key)
+            if key is None:
+                self.ledger.add(start, end)
+                self.ledger.save()
+            return {"found": self._found()}
+
+    def hit(self, worker, key, hash160, exact):
+        with self.lock:
+            self._seen(worker)
+            self.queue.connection.execute("INSERT INTO hits VALUES (?, ?, ?, ?, ?)",
+                                          (worker, str(key), hash160, int(exact), time.time()))
+            logging.info(f"{'Exact' if exact else 'Prefix'} hit from {worker}: {key} -> {hash160}")
+            return {"found": self._found()}
+
+    def _found(self):
+        found = self.queue.found_key()
+        return None if found is None else str(found)
+
+    def status(self):
+        with self.lock:
+            now = time.time()
+            live = sorted(worker for worker, seen in self.workers.items() if now - seen < 3 * HEARTBEAT_INTERVAL)
+            hits = self.queue.connection.execute("SELECT COUNT(*) FROM hits").fetchone()[0]
+            return {"queue": self.queue.counts(), "live_workers": live, "hits": hits, "found": self._found(),
+                    "coverage": self.ledger.coverage(self.min_key, self.max_key)}
+
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    # JSON over HTTP: GET /config and /status, POST /lease, /heartbeat, /complete and /hit
+    def do_GET(self):
+        coordinator = self.server.coordinator
+        routes = {"/config": coordinator.config, "/status": coordinator.status}
+        if self.path not in routes:
+            return self._reply(404, {"error": f"Unknown path {self.path}"})
+        self._reply(200, routes[self.path]())
+
+    def do_POST(self):
+        coordinator = self.server.coordinator
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        try:
+            if self.path == "/lease":
+                payload = coordinator.lease(body["worker"], body.get("count", 1))
+            elif self.path == "/heartbeat":
+                payload = coordinator.heartbeat(body["worker"], body.get("leases", []))
+            elif self.path == "/complete":
+                key = body.get("key")
+                payload = coordinator.complete(body["worker"], body["range_id"], int(body["start"]), int(body["end"]),
+                                               None if key is None else int(key))
+            elif self.path == "/hit":
+                payload = coordinator.hit(body["worker"], int(body["key"]), body["hash160"], body["exact"])
+            else:
+                return self._reply(404, {"error": f"Unknown path {self.path}"})
+        except (KeyError, ValueError) as e:
+            return self._reply(400, {"error": f"Bad request: {e}"})
+        self._reply(200, payload)
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+# Serve a coordinator until interrupted
+def run_coordinator(port=COORDINATOR_PORT, min_key=MIN_KEY, max_key=MAX_KEY, step_size=STEP_SIZE,
+                    targets=TARGET_HASH160S, prefix_length=PREFIX_LENGTH, queue_path=QUEUE_FILE):
+    coordinator = Coordinator(min_key, max_key, step_size, targets, prefix_length, queue_path)
+    server = ThreadingHTTPServer(("", port), CoordinatorHandler)
+    server.coordinator = coordinator
+    logging.info(f"Coordinator for [{coordinator.min_key}, {coordinator.max_key}] listening on port {port}.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        coordinator.ledger.save()
+    return coordinator
+
+
+# JSON request to the coordinator, retried with backoff while it is unreachable
+def request(url, path, payload=None):
+    data = None if payload is None else json.dumps(payload).encode()
+    for attempt in range(REQUEST_RETRIES):
+        try:
+            with urlopen(Request(url + path, data=data, headers={"Content-Type": "application/json"}), timeout=30) as response:
+                return json.loads(response.read())
+        except (URLError, ConnectionError, socket.timeout) as e:
+            if attempt == REQUEST_RETRIES - 1:
+                raise
+            logging.warning(f"Coordinator request {path} failed ({e}); retrying.")
+            time.sleep(2 ** attempt)
+
+
+# Default strategy: scan every key of the lease, reporting prefix hits as they come
+def scan_range(start, end, matcher, report, token=None):
+    for key, _, digest in checked(iterate_key_range(start, end), token):
+        match = matcher.match(digest)
+        if match:
+            report(key, digest, match)
+            if match == EXACT_HIT:
+                return key
+    return None
+
+
+# "scan", or "module.function" for any existing function(start, end, matcher) that returns the found key
+def load_strategy(name):
+    if name == "scan":
+        return scan_range
+    module_name, function_name = name.rsplit(".", 1)
+    return partial(_call_strategy, getattr(importlib.import_module(module_name), function_name))
+
+
+# Other strategies are not cancellable mid-range; the token only stops them between leases
+def _call_strategy(function, start, end, matcher, report, token=None):
+    return function(start, end, matcher)
+
+
+# Send heartbeats for the leases a worker holds until it stops; cancel the token once any worker has found the key
+def send_heartbeats(url, worker, held, stop, interval, token):
+    while not stop.wait(interval):
+        try:
+            reply = request(url, "/heartbeat", {"worker": worker, "leases": sorted(held)})
+        except (URLError, ConnectionError, socket.timeout) as e:
+            logging.warning(f"Heartbeat from {worker} failed: {e}")
+            continue
+        if reply["found"] is not None:
+            token.cancel()
+
+
+# Worker loop: lease ranges from the coordinator and scan them until the range is done or the key is found
+def run_worker(worker_index, url, strategy="scan"):
+    config = request(url, "/config")
+    matcher = TargetMatcher(config["targets"], config["prefix_length"])
+    scan = load_strategy(strategy)
+    worker = f"{socket.gethostname()}:{os.getpid()}:{worker_index}"
+    # Shared with the other worker processes on this machine when run_workers started us
+    token = get_worker_state("cancellation", None) or CancellationToken()
+    held = set()
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=send_heartbeats,
+                                 args=(url, worker, held, stop, config["heartbeat_interval"], token), daemon=True)
+    heartbeat.start()
+
+    def report(key, digest, match):
+        request(url, "/hit", {"worker": worker, "key": str(key), "hash160": digest.hex(), "exact": match == EXACT_HIT})
+
+    try:
+        while not token.cancelled():
+            reply = request(url, "/lease", {"worker": worker, "count": 1})
+            if reply["found"] is not None or not reply["leases"]:
+                return None if reply["found"] is None else int(reply["found"])
+            for range_id, start, end in reply["leases"]:
+                held.add(range_id)
+                key = scan(int(start), int(end), matcher, report, token)
+                if key is not None:
+                    token.cancel()  # Stop the other workers on this machine before reporting
+                request(url, "/complete", {"worker": worker, "range_id": range_id, "start": start, "end": end,
+                                           "key": None if key is None else str(key)})
+                held.discard(range_id)
+                if key is not None:
+                    logging.info(f"Worker {worker} found the key: {key}")
+                    return key
+        return None
+    except Cancelled:  # The key was found elsewhere; the abandoned lease no longer matters
+        return None
+    finally:
+        stop.set()
+
+
+# Run several worker processes on this machine against one coordinator
+def run_workers(url, processes=None, strategy="scan"):
+    processes = processes or os.cpu_count()
+    token = CancellationToken()
+    with create_process_pool(processes, cancellation=token) as executor:
+        try:
+            results = list(map_in_chunks(executor, partial(run_worker, url=url, strategy=strategy), range(processes),
+                                         chunksize=1))
+        finally:
+            token.cancel()  # On an interrupt, stop the workers instead of waiting for their ranges
+    return next((result for result in results if result is not None), None)
+
+
+# Usage: python distributed.py coordinator [port]
+#        python distributed.py worker <coordinator url> [processes] [strategy]
+if __name__ == "__main__":
+    if sys.argv[1] == "coordinator":
+        run_coordinator(int(sys.argv[2]) if len(sys.argv) > 2 else COORDINATOR_PORT)
+    else:
+        url = sys.argv[2].rstrip("/")
+        processes = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        found_key = run_workers(url, processes, sys.argv[4] if len(sys.argv) > 4 else "scan")
+        if found_key:
+            logging.info(f"Success! Private key found: {found_key}")
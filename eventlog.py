@@ -0,0 +1,163 @@
+import sys
+import json
+import time
+import queue
+import logging
+import threading
+from collections import Counter
+from logging.handlers import QueueHandler
+from workerpool import get_context
+
+# Constants
+EVENT_FILE = "events.jsonl"
+RATE_LIMIT = 20  # Records of one event type written per interval; the rest are only counted
+AGGREGATE_INTERVAL = 10  # Seconds per rate-limit window and between "N events in the last 10s" summaries
+CONSOLE_FORMAT = "%(asctime)s - %(message)s"
+
+
+# Log a structured event: `name` is its type for rate limiting, `fields` go into its JSON line
+def log_event(name, message, level=logging.INFO, **fields):
+    logging.log(level, message, extra={"event": name, "fields": fields})
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record: time, level, event type, message and the event's fields."""
+
+    def format(self, record):
+        entry = {"time": round(record.created, 3), "level": record.levelname}
+        event = getattr(record, "event", None)
+        if event is not None:
+            entry["event"] = event
+        entry["message"] = record.getMessage()
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, separators=(",", ":"), default=str)
+
+
+class EventLog:
+    """
+    Logging that keeps I/O off the hot path. While started, the root logger's
+    only handler is a QueueHandler, so a logging call formats the message and
+    appends it to a queue; a background thread takes records off the queue
+    and does all the writing: JSON lines to `path` and a readable line to the
+    console. The queue is a multiprocessing queue, so forked pool workers log
+    through the same thread.
+
+    The writer thread rate-limits events (records logged with log_event): at
+    most `rate_limit` records per event type per AGGREGATE_INTERVAL seconds
+    are written, the rest are counted and reported as one summary record,
+    e.g. "1234 prefix_hit events in the last 10s (1214 not shown)". Plain
+    logging calls and warnings are never dropped. `routes` maps an event type
+    to an extra file that receives every such event as JSON lines, unlimited,
+    for data that must not be lost.
+    """
+
+    def __init__(self, path=EVENT_FILE, level=logging.INFO, console=True, console_format=CONSOLE_FORMAT,
+                 rate_limit=RATE_LIMIT, interval=AGGREGATE_INTERVAL, routes=None):
+        self.level = level
+        self.rate_limit = rate_limit
+        self.interval = interval
+        self.handlers = []
+        if path is not None:
+            self.handlers.append(logging.FileHandler(path))
+            self.handlers[-1].setFormatter(JsonFormatter())
+        if console:
+            self.handlers.append(logging.StreamHandler())
+            self.handlers[-1].setFormatter(logging.Formatter(console_format))
+        self.routes = {}
+        for event, route_path in (routes or {}).items():
+            self.routes[event] = logging.FileHandler(route_path, delay=True)
+            self.routes[event].setFormatter(JsonFormatter())
+        self.queue = get_context().Queue()
+        self.counts = Counter()  # Events seen in the current window, per type
+        self.suppressed = Counter()  # Of those, not written
+        self._thread = None
+        self._previous = None
+
+    def start(self):
+        root = logging.getLogger()
+        self._previous = (root.handlers[:], root.level)
+        root.handlers = [QueueHandler(self.queue)]
+        root.setLevel(self.level)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    # Restore the previous handlers, then write everything still queued
+    def stop(self):
+        root = logging.getLogger()
+        root.handlers, level = self._previous
+        root.setLevel(level)
+        self.queue.put(None)
+        self._thread.join()
+        self._thread = None
+        for handler in self.handlers + list(self.routes.values()):
+            handler.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+    def _run(self):
+        window_end = time.monotonic() + self.interval
+        while True:
+            try:
+                record = self.queue.get(timeout=max(0, window_end - time.monotonic()))
+            except queue.Empty:
+                record = False
+            if record is None:  # stop()
+                self._flush_summaries()
+                return
+            if record:
+                self._handle(record)
+            if time.monotonic() >= window_end:
+                self._flush_summaries()
+                window_end = time.monotonic() + self.interval
+
+    def _handle(self, record):
+        event = getattr(record, "event", None)
+        if event in self.routes:
+            self.routes[event].handle(record)
+        if event is not None and record.levelno < logging.WARNING:
+            self.counts[event] += 1
+            if self.counts[event] > self.rate_limit:
+                self.suppressed[event] += 1
+                return
+        self._write(record)
+
+    def _write(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    # One summary record per event type that was rate-limited in this window
+    def _flush_summaries(self):
+        for event, suppressed in self.suppressed.items():
+            self._write(logging.makeLogRecord({
+                "msg": f"{self.counts[event]} {event} events in the last {self.interval}s ({suppressed} not shown)",
+                "levelno": logging.INFO, "levelname": "INFO", "event": "summary",
+                "fields": {"of": event, "count": self.counts[event], "suppressed": suppressed,
+                           "seconds": self.interval},
+            }))
+        self.counts.clear()
+        self.suppressed.clear()
+
+
+# Usage: python eventlog.py <events file>  (events per type, counting the ones rate-limited away)
+if __name__ == "__main__":
+    written, suppressed = Counter(), Counter()
+    with open(sys.argv[1]) as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry.get("event") == "summary":
+                suppressed[entry["of"]] += entry["suppressed"]
+            else:
+                written[entry.get("event", entry["level"])] += 1
+    for name in sorted(written.keys() | suppressed.keys(), key=lambda name: -written[name] - suppressed[name]):
+        print(f"{name:20s} {written[name] + suppressed[name]:10d} ({suppressed[name]} not written)")
@@ -0,0 +1,181 @@
+import numpy as np
+from secp256k1 import P, batch_jacobian_to_affine, generator_powers
+
+# Field elements are stored as 10 limbs of 26 bits in uint64 lanes, shape (LIMBS, N):
+# products of two limbs fit in 53 bits, so a full 10x10 column sum stays below 2^64
+LIMBS = 10
+LIMB_BITS = 26
+LIMB_MASK = np.uint64((1 << LIMB_BITS) - 1)
+
+# 2^260 = 2^4 * 2^256 = 2^36 + 15632 (mod p), split across the two lowest limbs
+FOLD_LOW = np.uint64(15632)
+FOLD_HIGH = np.uint64(1 << 10)
+
+
+# Limbs of a Python int, as a list
+def _int_limbs(value):
+    return [(value >> (LIMB_BITS * i)) & ((1 << LIMB_BITS) - 1) for i in range(LIMBS)]
+
+
+# 32p with every limb raised to at least 2^27 - 2 by borrowing from the next limb,
+# so that (a + SUB_BIAS - b) never underflows for normalized b
+def _sub_bias():
+    limbs = _int_limbs(32 * P)
+    limbs[-1] = (32 * P) >> (LIMB_BITS * (LIMBS - 1))  # 32p needs 261 bits; keep the top limb whole
+    for i in range(LIMBS - 1):
+        limbs[i] += 2 << LIMB_BITS
+        limbs[i + 1] -= 2
+    return np.array(limbs, dtype=np.uint64).reshape(LIMBS, 1)
+
+
+SUB_BIAS = _sub_bias()
+P_LIMBS = np.array(_int_limbs(P), dtype=np.int64).reshape(LIMBS, 1)
+
+
+# Convert Python ints in [0, 2^256) to an (LIMBS, N) limb array
+def to_limbs(values):
+    raw = b"".join(value.to_bytes(32, byteorder="little") for value in values)
+    words = np.frombuffer(raw, dtype="<u8").reshape(-1, 4).T
+    limbs = np.empty((LIMBS, words.shape[1]), dtype=np.uint64)
+    for i in range(LIMBS):
+        word, offset = divmod(LIMB_BITS * i, 64)
+        value = words[word] >> np.uint64(offset)
+        if offset + LIMB_BITS > 64 and word + 1 < 4:
+            value |= words[word + 1] << np.uint64(64 - offset)
+        limbs[i] = value & LIMB_MASK
+    return limbs
+
+
+# Convert an (LIMBS, N) limb array back to Python ints reduced modulo p
+def from_limbs(limbs):
+    values = [0] * limbs.shape[1]
+    for i in range(LIMBS - 1, -1, -1):
+        row = limbs[i].tolist()
+        values = [(value << LIMB_BITS) + limb for value, limb in zip(values, row)]
+    return [value % P for value in values]
+
+
+# Propagate carries so every limb is close to 26 bits; the value is only reduced
+# below 2^260, not below p
+def normalize(limbs, rounds=3):
+    limbs = limbs.copy()
+    for _ in range(rounds):
+        carry = limbs >> np.uint64(LIMB_BITS)
+        limbs &= LIMB_MASK
+        limbs[1:] += carry[:-1]
+        limbs[0] += carry[-1] * FOLD_LOW
+        limbs[1] += carry[-1] * FOLD_HIGH
+    return limbs
+
+
+# Fully reduce to the canonical representative in [0, p)
+def reduce(limbs):
+    limbs = normalize(limbs)
+    # Fold the bits above 2^256 (the top 4 bits of limb 9): 2^256 = 2^32 + 977 (mod p)
+    top = limbs[-1] >> np.uint64(22)
+    limbs[-1] &= np.uint64((1 << 22) - 1)
+    limbs[0] += top * np.uint64(977)
+    limbs[1] += top * np.uint64(1 << 6)
+    for i in range(LIMBS - 1):
+        limbs[i + 1] += limbs[i] >> np.uint64(LIMB_BITS)
+        limbs[i] &= LIMB_MASK
+
+    # Now below 2^256 + small, so at most one subtraction of p is needed
+    difference = limbs.astype(np.int64) - P_LIMBS
+    for i in range(LIMBS - 1):
+        borrow = difference[i] < 0
+        difference[i] += borrow * (1 << LIMB_BITS)
+        difference[i + 1] -= borrow
+    keep = difference[-1] < 0
+    return np.where(keep, limbs, difference.astype(np.uint64))
+
+
+# a + b (mod p); one carry round is enough for normalized inputs
+def add(a, b):
+    return normalize(a + b, rounds=1)
+
+
+# a - b (mod p)
+def sub(a, b):
+    return normalize(a + SUB_BIAS - b, rounds=1)
+
+
+# a * b (mod p): schoolbook column products, then fold the high half with 2^260 = 2^36 + 15632
+def mul(a, b):
+    count = np.broadcast_shapes(a.shape, b.shape)[1]
+    columns = np.zeros((2 * LIMBS, count), dtype=np.uint64)
+    for i in range(LIMBS):
+        columns[i:i + LIMBS] += a[i] * b
+
+    for _ in range(2):
+        carry = columns[:-1] >> np.uint64(LIMB_BITS)
+        columns[:-1] &= LIMB_MASK
+        columns[1:] += carry
+
+    high = columns[LIMBS:]
+    low = columns[:LIMBS] + high * FOLD_LOW
+    low[1:] += high[:-1] * FOLD_HIGH
+    top = high[-1] * FOLD_HIGH  # Lands on limb 10, i.e. another multiple of 2^260
+    low[0] += top * FOLD_LOW
+    low[1] += top * FOLD_HIGH
+    return normalize(low)
+
+
+# a^2 (mod p)
+def sqr(a):
+    return mul(a, a)
+
+
+# Constant field element broadcast against (LIMBS, N) arrays
+def constant(value):
+    return np.array(_int_limbs(value % P), dtype=np.uint64).reshape(LIMBS, 1)
+
+
+# Add the same affine point to N Jacobian points (X, Y, Z) in lockstep
+def jacobian_add_affine_batch(x1, y1, z1, x2, y2):
+    """
+    Mixed addition without the doubling and infinity special cases, which
+    cannot occur when the Jacobian points are k*G and the affine point is
+    2^i G with k < 2^i.
+    """
+    z1z1 = sqr(z1)
+    h = sub(mul(x2, z1z1), x1)
+    r = sub(mul(y2, mul(z1, z1z1)), y1)
+    hh = sqr(h)
+    hhh = mul(h, hh)
+    v = mul(x1, hh)
+    x3 = sub(sub(sqr(r), hhh), add(v, v))
+    y3 = sub(mul(r, sub(v, x3)), mul(y1, hhh))
+    z3 = mul(z1, h)
+    return x3, y3, z3
+
+
+# Multiply G by many scalars in lockstep; returns affine (x, y) int pairs
+def multiply_generator_batch(scalars):
+    count = len(scalars)
+    if not count:
+        return []
+    raw = b"".join(scalar.to_bytes(32, byteorder="little") for scalar in scalars)
+    bits = np.unpackbits(np.frombuffer(raw, dtype=np.uint8).reshape(count, 32), axis=1, bitorder="little").T.astype(bool)
+
+    x = np.zeros((LIMBS, count), dtype=np.uint64)
+    y = np.zeros((LIMBS, count), dtype=np.uint64)
+    z = np.zeros((LIMBS, count), dtype=np.uint64)
+    empty = np.ones(count, dtype=bool)  # Lanes still at the point at infinity
+    for bit, (px, py) in enumerate(generator_powers()):
+        selected = bits[bit]
+        if not selected.any():
+            continue
+        x_power, y_power = constant(px), constant(py)
+        x3, y3, z3 = jacobian_add_affine_batch(x, y, z, x_power, y_power)
+        first = selected & empty
+        later = selected & ~empty
+        x = np.where(later, x3, np.where(first, x_power, x))
+        y = np.where(later, y3, np.where(first, y_power, y))
+        z = np.where(later, z3, np.where(first, constant(1), z))
+        empty &= ~selected
+
+    if empty.any():
+        raise ValueError("Scalars must be non-zero")
+    # One shared inversion converts every lane back to affine coordinates
+    return batch_jacobian_to_affine(list(zip(from_limbs(x), from_limbs(y), from_limbs(z))))
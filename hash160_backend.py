@@ -0,0 +1,189 @@
+import os
+import time
+import logging
+import numpy as np
+from fieldvec import multiply_generator_batch
+from hashbatch import hash160_many, to_array
+from secp256k1 import (
+    batch_jacobian_to_affine,
+    compress_point,
+    jacobian_multiply_generator,
+    jacobian_to_affine,
+    pubkey_to_hash160,
+)
+
+try:
+    from ecdsa import SigningKey, SECP256k1
+except ImportError:  # The pure-integer backend does not need it
+    SigningKey = None
+
+try:
+    import coincurve
+except ImportError:  # Optional accelerated backend
+    coincurve = None
+
+# Known private keys and their compressed-pubkey hash160s, checked before a backend is used
+KNOWN_ANSWERS = {
+    1: "751e76e8199196d454941c45d1b3a323f1433bd6",
+    2: "06afd46bcdfd22ef94ac122aa11f241244a37ecc",
+    0x2832ED74F2B5E35EE: "20d45a6a762535700ce9e0b216e31994335db8a5",
+}
+HASH_BATCH_SIZE = 4096  # Keys per backend batch in iterate_hash160
+BENCHMARK_KEYS = HASH_BATCH_SIZE // 4  # Keys per backend in the startup benchmark, weighing batch overhead as real batches do
+BACKEND_ENV = "HASH160_BACKEND"  # Set to a backend name to skip auto-selection
+
+
+# Original path: ecdsa SigningKey per key
+class EcdsaBackend:
+    name = "ecdsa"
+
+    @staticmethod
+    def available():
+        return SigningKey is not None
+
+    def pubkey(self, private_key):
+        pk_bytes = private_key.to_bytes(32, byteorder="big")
+        point = SigningKey.from_string(pk_bytes, curve=SECP256k1).verifying_key.to_string()
+        return (b'\x02' if point[-1] % 2 == 0 else b'\x03') + point[:32]
+
+    def hash160(self, private_key):
+        return pubkey_to_hash160(self.pubkey(private_key))
+
+    def hash160_batch(self, private_keys):
+        return hash160_many([self.pubkey(key) for key in private_keys])
+
+
+# Pure-integer Jacobian-coordinate scalar multiplication
+class JacobianBackend:
+    name = "jacobian"
+
+    @staticmethod
+    def available():
+        return True
+
+    def hash160(self, private_key):
+        point = jacobian_to_affine(jacobian_multiply_generator(private_key))
+        return pubkey_to_hash160(compress_point(point))
+
+    def hash160_batch(self, private_keys):
+        # One inversion converts the whole batch back to affine coordinates
+        points = batch_jacobian_to_affine([jacobian_multiply_generator(key) for key in private_keys])
+        return hash160_many([compress_point(point) for point in points])
+
+
+# Many scalar multiplications in lockstep on NumPy multi-limb field arithmetic
+class NumpyBackend(JacobianBackend):
+    name = "numpy"
+
+    def hash160_batch(self, private_keys):
+        points = multiply_generator_batch(private_keys)
+        return hash160_many([compress_point(point) for point in points])
+
+
+# libsecp256k1 bindings, used when the coincurve package is installed
+class CoincurveBackend:
+    name = "coincurve"
+
+    @staticmethod
+    def available():
+        return coincurve is not None
+
+    def pubkey(self, private_key):
+        pubkey = coincurve.PublicKey.from_secret(private_key.to_bytes(32, byteorder="big"))
+        return pubkey.format(compressed=True)
+
+    def hash160(self, private_key):
+        return pubkey_to_hash160(self.pubkey(private_key))
+
+    def hash160_batch(self, private_keys):
+        return hash160_many([self.pubkey(key) for key in private_keys])
+
+
+BACKENDS = [CoincurveBackend, NumpyBackend, JacobianBackend, EcdsaBackend]
+
+_backends = {}
+_selected_backend = None
+
+
+# Check a backend against the known answers
+def passes_known_answers(backend):
+    try:
+        digests = backend.hash160_batch(list(KNOWN_ANSWERS))
+        return [digest.hex() for digest in digests] == list(KNOWN_ANSWERS.values()) and all(
+            backend.hash160(key).hex() == expected for key, expected in KNOWN_ANSWERS.items()
+        )
+    except Exception as e:
+        logging.warning(f"hash160 backend {backend.name} failed its known-answer check: {e}")
+        return False
+
+
+# Time one batch of keys through a backend
+def benchmark_backend(backend, keys):
+    started = time.perf_counter()
+    backend.hash160_batch(keys)
+    return time.perf_counter() - started
+
+
+# Pick the fastest available backend that passes the known-answer check
+def select_backend():
+    keys = [0x2832ED74F2B5E35EE + i for i in range(BENCHMARK_KEYS)]
+    timings = []
+    for backend_class in BACKENDS:
+        if not backend_class.available():
+            continue
+        backend = backend_class()
+        if passes_known_answers(backend):
+            timings.append((benchmark_backend(backend, keys), backend))
+    if not timings:
+        raise RuntimeError("No hash160 backend passed the known-answer check")
+    elapsed, backend = min(timings, key=lambda timing: timing[0])
+    logging.debug(f"Selected hash160 backend {backend.name} ({BENCHMARK_KEYS / elapsed:.0f} keys/s)")
+    return backend
+
+
+# Return a backend by name, or the auto-selected one
+def get_backend(name=None):
+    global _selected_backend
+    name = name or os.environ.get(BACKEND_ENV)
+    if name:
+        if name not in _backends:
+            backend_class = next((cls for cls in BACKENDS if cls.name == name), None)
+            if backend_class is None or not backend_class.available():
+                raise ValueError(f"hash160 backend {name!r} is not available")
+            _backends[name] = backend_class()
+        return _backends[name]
+    if _selected_backend is None:
+        _selected_backend = select_backend()
+    return _selected_backend
+
+
+# Function to generate hash160 from a private key
+def private_key_to_hash160(private_key):
+    return get_backend().hash160(private_key).hex()
+
+
+# Generate hash160s for a batch of private keys
+def private_keys_to_hash160(private_keys):
+    return [hash160 for _, hash160 in iterate_hash160(private_keys)]
+
+
+# Yield (key, hash160) for many private keys, hashing them in backend batches
+def iterate_hash160(private_keys, batch_size=HASH_BATCH_SIZE):
+    backend = get_backend()
+    batch = []
+    for key in private_keys:
+        batch.append(key)
+        if len(batch) == batch_size:
+            yield from zip(batch, [digest.hex() for digest in backend.hash160_batch(batch)])
+            batch = []
+    if batch:
+        yield from zip(batch, [digest.hex() for digest in backend.hash160_batch(batch)])
+
+
+# Raw digests of many private keys as an (N, 20) uint8 array, hashed in backend batches
+def hash160_array(private_keys, batch_size=HASH_BATCH_SIZE):
+    backend = get_backend()
+    private_keys = list(private_keys)
+    batches = [to_array(backend.hash160_batch(private_keys[i:i + batch_size]), 20)
+               for i in range(0, len(private_keys), batch_size)]
+    return np.concatenate(batches) if batches else np.zeros((0, 20), dtype=np.uint8)
@@ -1,8 +1,15 @@
 import random
-import hashlib
-from ecdsa import SigningKey, SECP256k1
 import os
-from concurrent.futures import ThreadPoolExecutor
+from cancellation import CancellationToken, Cancelled, cancel_executor, checked
+from checkpoint import Checkpoint
+from coverage_ledger import CoverageLedger, ledger_path
+from hash160_backend import private_key_to_hash160
+from matcher import EXACT_HIT, TargetMatcher
+from metrics import Metrics, record
+from preload_cache import PreloadCache
+from rangesource import RangeSource
+from secp256k1 import iterate_key_range
+from workerpool import create_process_pool, get_worker_state, map_bounded, set_worker_state
 
 # Constants
 MIN_KEY = 73786976294838206464
@@ -10,79 +17,104 @@ MAX_KEY = 147573952589676412927
 STEP_SIZE = 1234567890
 PREFIX_LENGTH = 4  # Number of bytes to match in the prefix
 HASH_SET_SIZE = 500  # Number of precomputed prefixes
-MAX_WORKERS = 4  # Fewer threads to save memory
+MAX_WORKERS = 4  # Fewer worker processes to save memory
+IN_FLIGHT = 4 * MAX_WORKERS  # Ranges submitted ahead of the results being consumed
+RANGE_CHECKPOINT = "hashset_ranges.ckpt"  # Cursor of the next range, for resuming
 TARGET_HASH160 = "739437bb3dd6d1983e66629c5f08c70e52769371"  # Full hash to match
 
-# Function to generate hash160 from a private key
-def private_key_to_hash160(private_key):
-    pk_bytes = private_key.to_bytes(32, byteorder="big")
-    signing_key = SigningKey.from_string(pk_bytes, curve=SECP256k1)
-    verifying_key = signing_key.verifying_key
-    compressed_pubkey = (b'\x02' if verifying_key.to_string()[-1] % 2 == 0 else b'\x03') + verifying_key.to_string()[:32]
-    sha256 = hashlib.sha256(compressed_pubkey).digest()
-    ripemd160 = hashlib.new("ripemd160", sha256).digest()
-    return ripemd160.hex()
-
-# Create a hash set for precomputed prefixes
+# Create a hash set for precomputed prefixes; the sample digests are hashed once and reused from the preload cache
 def create_hash_set(size):
-    hash_set = set()
-    for _ in range(size):
-        random_key = random.randint(MIN_KEY, MAX_KEY)
-        hash160_prefix = private_key_to_hash160(random_key)[:PREFIX_LENGTH]
-        hash_set.add(hash160_prefix)
-    return hash_set
+    return PreloadCache(MIN_KEY, MAX_KEY).hash_set(size, PREFIX_LENGTH)
 
 # Selective expansion within a specific range
-def selective_expansion(start_key, end_key, target_prefix):
+def selective_expansion(start_key, end_key, matcher, token=None):
     print(f"Expanding search in range: {start_key} to {end_key}")
-    for key in range(start_key, end_key + 1):
-        hash160 = private_key_to_hash160(key)
-        if hash160.startswith(target_prefix):  # Prefix match
-            print(f"Prefix match found: {key} -> {hash160}")
-            if hash160 == TARGET_HASH160:  # Exact match
-                print(f"Exact match found: {key} -> {hash160}")
+    for key, _, digest in checked(iterate_key_range(start_key, end_key), token):
+        match = matcher.match(digest)
+        if match:  # Prefix match
+            print(f"Prefix match found: {key} -> {digest.hex()}")
+            record(prefix_hits=1)
+            if match == EXACT_HIT:  # Exact match
+                print(f"Exact match found: {key} -> {digest.hex()}")
                 return key
     return None
 
-# Function to process a single range
-def process_range(start, end, target_prefix, hash_set):
+# Function to process a single range; returns (scanned in full, found key)
+def process_range(start, end, matcher, hash_set, token=None):
     # Randomly sample a key in the range and check against the hash set
     sample_key = random.randint(start, end)
-    hash160_prefix = private_key_to_hash160(sample_key)[:len(target_prefix)]
+    hash160_prefix = private_key_to_hash160(sample_key)[:matcher.prefix_length]
 
     if hash160_prefix in hash_set:
         print(f"Potential match in range {start} to {end} (prefix: {hash160_prefix})")
         # Perform selective expansion if hash set suggests a match
-        return selective_expansion(start, end, target_prefix)
-    return None
+        return True, selective_expansion(start, end, matcher, token)
+    return False, None
+
+# Worker initializer: keep the target matcher and hash set in each worker process
+def init_worker(matcher, hash_set):
+    set_worker_state(matcher=matcher, hash_set=hash_set)
+
+# Process a (start, end) range inside a worker process; also report whether it was scanned in full
+def process_range_task(key_range):
+    start, end = key_range
+    token = get_worker_state("cancellation")
+    try:
+        scanned, result = process_range(start, end, get_worker_state("matcher"), get_worker_state("hash_set"), token)
+    except Cancelled:  # Another worker found the key
+        return key_range, False, None
+    if result:
+        token.cancel()  # Stop the other workers without waiting for the parent to see this result
+    record(keys=1 + (end - start + 1 if scanned else 0), ranges=1, covered=end - start + 1)
+    return key_range, scanned, result
 
 # Parallel processing of ranges
-def search_with_parallelization(target_prefix):
-    print(f"Target prefix: {target_prefix}")
+def search_with_parallelization(matcher):
+    print(f"Targets: {len(matcher)}, prefix length: {matcher.prefix_length}")
 
     # Step 1: Initialize the hash set
     hash_set = create_hash_set(size=HASH_SET_SIZE)
 
     # Step 2: Parallel processing of ranges
     print("Starting parallel search...")
-    ranges = [(start, min(start + STEP_SIZE - 1, MAX_KEY)) for start in range(MIN_KEY, MAX_KEY, STEP_SIZE)]
+    ledger = CoverageLedger(ledger_path(matcher.targets()))
+    print(f"Already scanned: {100 * ledger.coverage(MIN_KEY, MAX_KEY):.6f}% of the key range")
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        results = executor.map(lambda r: process_range(r[0], r[1], target_prefix, hash_set), ranges)
+    token = CancellationToken()
+    with Checkpoint(RANGE_CHECKPOINT) as checkpoint:
+        # Ranges are generated lazily and resume from the saved cursor
+        ranges = RangeSource(MIN_KEY, MAX_KEY, STEP_SIZE, ledger, checkpoint)
+        print(f"Starting at key {ranges.cursor} ({100 * ranges.progress():.6f}% of the key range done)")
+        metrics = Metrics(total=MAX_KEY - MIN_KEY + 1, completed=ranges.cursor - MIN_KEY, slots=MAX_WORKERS + 1,
+                          report=print)
+        metrics.gauge("queue_depth", lambda: (MAX_KEY - ranges.cursor) // STEP_SIZE + 1)  # Ranges still to scan
+        metrics.gauge("checkpoint_seconds", lambda: checkpoint.save_seconds)
+        with metrics, create_process_pool(MAX_WORKERS, initializer=init_worker, initargs=(matcher, hash_set),
+                                          cancellation=token, metrics=metrics) as executor:
+            results = map_bounded(executor, process_range_task, ranges, IN_FLIGHT)
 
-    # Step 3: Check results for any found keys
-    for result in results:
-        if result:
-            print(f"Found key: {result}")
-            return result
+            # Step 3: Record fully scanned ranges and check results for any found keys
+            try:
+                for (start, end), scanned, result in results:
+                    if result:
+                        print(f"Found key: {result}")
+                        return result
+                    if scanned:
+                        ledger.add(start, end)
+                    if not token.cancelled():  # Cancelled ranges were not checked
+                        ranges.advance(end)
+            finally:
+                # Found, interrupted or done: stop the ranges still running or queued instead of waiting for them
+                cancel_executor(executor, token)
+                ledger.save()
 
     print("No matching key found.")
     return None
 
 # Usage
 if __name__ == "__main__":
-    target_prefix = TARGET_HASH160[:PREFIX_LENGTH]  # Example target prefix
-    found_key = search_with_parallelization(target_prefix)
+    matcher = TargetMatcher([TARGET_HASH160], PREFIX_LENGTH)  # Add more target hash160s as needed
+    found_key = search_with_parallelization(matcher)
     if found_key:
         print(f"Found key: {found_key}")
     else:
@@ -0,0 +1,260 @@
+import os
+import sys
+import math
+import time
+import random
+import sqlite3
+import hashlib
+import logging
+from concurrent.futures import FIRST_COMPLETED, wait
+from secp256k1 import N, P, batch_inverse, compress_point, decode_pubkey, point_add, point_multiply
+from workerpool import create_process_pool, get_worker_state, set_worker_state
+
+# Constants
+MIN_KEY = 73786976294838206464
+MAX_KEY = 147573952589676412927
+HERD_SIZE = 256  # Kangaroos per worker, stepped in lockstep with one shared inversion
+STEPS_PER_TASK = 2 ** 12  # Jumps per kangaroo before a herd reports back to the coordinator
+MAX_WORKERS = os.cpu_count()
+DP_STORE = "kangaroo_dps.sqlite"
+PROGRESS_INTERVAL = 30  # Seconds between progress lines
+GIVE_UP_FACTOR = 8  # Stop after this many times the expected number of jumps
+
+TAME = 0
+WILD = 1
+
+# Logging configuration
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+
+class DistinguishedPointStore:
+    """
+    Distinguished points on disk in SQLite, keyed by search id and x coordinate.
+    Tame points store their private key and wild points their distance from the
+    target, so a tame/wild pair at the same x gives key = tame - wild. The file
+    survives restarts, and stores from several machines can be merged.
+    """
+
+    def __init__(self, path=DP_STORE):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS distinguished_points (
+                search TEXT NOT NULL, x TEXT NOT NULL, kind INTEGER NOT NULL, value TEXT NOT NULL,
+                PRIMARY KEY (search, x)
+            );
+            CREATE TABLE IF NOT EXISTS collisions (
+                search TEXT NOT NULL, tame TEXT NOT NULL, wild TEXT NOT NULL
+            );
+        """)
+
+    # Store a point; return the (kind, value) already stored at x, if any
+    def add(self, search, x, kind, value):
+        row = self.connection.execute(
+            "SELECT kind, value FROM distinguished_points WHERE search = ? AND x = ?", (search, f"{x:064x}")
+        ).fetchone()
+        if row is not None:
+            return row[0], int(row[1])
+        self.connection.execute(
+            "INSERT INTO distinguished_points VALUES (?, ?, ?, ?)", (search, f"{x:064x}", kind, str(value))
+        )
+        return None
+
+    def commit(self):
+        self.connection.commit()
+
+    def count(self, search):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM distinguished_points WHERE search = ?", (search,)
+        ).fetchone()[0]
+
+    # Tame/wild value pairs recorded for a search by earlier merges
+    def collisions(self, search):
+        rows = self.connection.execute("SELECT tame, wild FROM collisions WHERE search = ?", (search,))
+        return [(int(tame), int(wild)) for tame, wild in rows]
+
+    # Merge another store into this one, recording tame/wild collisions between the two
+    def merge(self, other_path):
+        self.connection.execute("ATTACH DATABASE ? AS other", (other_path,))
+        self.connection.execute("""
+            INSERT INTO collisions
+            SELECT a.search,
+                   CASE WHEN a.kind = 0 THEN a.value ELSE b.value END,
+                   CASE WHEN a.kind = 0 THEN b.value ELSE a.value END
+            FROM distinguished_points a JOIN other.distinguished_points b
+              ON a.search = b.search AND a.x = b.x AND a.kind != b.kind
+        """)
+        self.connection.execute("INSERT OR IGNORE INTO distinguished_points SELECT * FROM other.distinguished_points")
+        self.connection.commit()
+        self.connection.execute("DETACH DATABASE other")
+
+    def close(self):
+        self.connection.close()
+
+
+# Powers of two whose mean is about (kangaroos * sqrt(width)) / 4, the optimal mean jump for a parallel herd
+def jump_sizes(width, kangaroos):
+    mean_target = max(1, kangaroos * math.isqrt(width) // 4)
+    count = 1
+    while (2 ** count - 1) // count < mean_target:
+        count += 1
+    return [2 ** i for i in range(count)]
+
+
+# Distinguished-point bits so each kangaroo finds a point every ~sqrt(width) / (16 * kangaroos) jumps
+def default_dp_bits(width, kangaroos):
+    return max(0, (math.isqrt(width) // (16 * kangaroos)).bit_length() - 1)
+
+
+# Identify a search so distinguished points are only ever combined with compatible ones
+def search_id(target, min_key, max_key, sizes, dp_bits):
+    description = f"{compress_point(target).hex()}:{min_key}:{max_key}:{len(sizes)}:{dp_bits}"
+    return hashlib.sha256(description.encode()).hexdigest()[:32]
+
+
+# A new kangaroo: [kind, value, x, y] with value the key (tame) or the distance from the target (wild)
+def new_kangaroo(kind, target, min_key, width):
+    if kind == TAME:
+        value = min_key + width // 2 + random.randrange(width // 2 + 1)
+        point = point_multiply(value)
+    else:
+        value = random.randrange(width // 2 + 1)
+        point = point_add(target, point_multiply(value)) if value else target
+    return [kind, value, point[0], point[1]]
+
+
+# Worker initializer: precompute the jump points once per worker
+def init_jumps(sizes, dp_bits):
+    set_worker_state(jump_sizes=sizes, jump_points=[point_multiply(size) for size in sizes], dp_mask=(1 << dp_bits) - 1)
+
+
+# Advance every kangaroo in the herd by `steps` jumps; return the herd and the distinguished points it hit
+def run_herd(herd, steps):
+    sizes = get_worker_state("jump_sizes")
+    points = get_worker_state("jump_points")
+    dp_mask = get_worker_state("dp_mask")
+    count = len(sizes)
+    distinguished = []
+    for _ in range(steps):
+        jumps = [kangaroo[2] % count for kangaroo in herd]
+        differences = [points[jump][0] - kangaroo[2] for jump, kangaroo in zip(jumps, herd)]
+        if not all(differences):  # A kangaroo sits on +/- a jump point; leave this round to point_add
+            inverses = None
+        else:
+            inverses = batch_inverse(differences)
+        for lane, (jump, kangaroo) in enumerate(zip(jumps, herd)):
+            jx, jy = points[jump]
+            x, y = kangaroo[2], kangaroo[3]
+            if inverses is None:
+                x3, y3 = point_add((x, y), (jx, jy))
+            else:
+                slope = (jy - y) * inverses[lane] % P
+                x3 = (slope * slope - x - jx) % P
+                y3 = (slope * (x - x3) - y) % P
+            kangaroo[1] += sizes[jump]
+            kangaroo[2], kangaroo[3] = x3, y3
+            if x3 & dp_mask == 0:
+                distinguished.append((lane, kangaroo[0], kangaroo[1], x3))
+    return herd, distinguished
+
+
+# Solve a tame/wild collision: the wild kangaroo sits at (key + wild)G and the tame one at +/- tame*G
+def solve_collision(target, tame, wild):
+    for key in ((tame - wild) % N, (-tame - wild) % N):
+        if key and point_multiply(key) == target:
+            return key
+    return None
+
+
+# Parallel Pollard kangaroo (lambda) search for a known public key in [min_key, max_key]
+def search_with_kangaroo(pubkey, min_key=MIN_KEY, max_key=MAX_KEY, dp_bits=None,
+                         herd_size=HERD_SIZE, max_workers=MAX_WORKERS, store_path=DP_STORE):
+    target = decode_pubkey(pubkey)
+    width = max_key - min_key
+    kangaroos = herd_size * max_workers
+    sizes = jump_sizes(width, kangaroos)
+    dp_bits = default_dp_bits(width, kangaroos) if dp_bits is None else dp_bits
+    search = search_id(target, min_key, max_key, sizes, dp_bits)
+    store = DistinguishedPointStore(store_path)
+
+    # Collisions found by merging stores from other machines may already solve it
+    for tame, wild in store.collisions(search):
+        key = solve_collision(target, tame, wild)
+        if key is not None:
+            logging.info(f"Private key found in merged distinguished points: {key}")
+            return key
+
+    expected_jumps = 2 * math.isqrt(width) + kangaroos * (1 << dp_bits)
+    expected_points = max(1, expected_jumps >> dp_bits)
+    logging.info(f"Kangaroo search over [{min_key}, {max_key}]: {kangaroos} kangaroos, "
+                 f"{len(sizes)} jump sizes, {dp_bits} DP bits, ~{expected_jumps} jumps expected.")
+
+    started = time.time()
+    points_at_start = store.count(search)
+    last_report = started
+    jumps_done = 0
+    try:
+        with create_process_pool(max_workers, initializer=init_jumps, initargs=(sizes, dp_bits)) as executor:
+            pending = {}
+            for _ in range(max_workers):
+                # Half of every herd is tame, half is wild
+                herd = [new_kangaroo(TAME if i % 2 == 0 else WILD, target, min_key, width) for i in range(herd_size)]
+                pending[executor.submit(run_herd, herd, STEPS_PER_TASK)] = None
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del pending[future]
+                    herd, distinguished = future.result()
+                    jumps_done += len(herd) * STEPS_PER_TASK
+                    for lane, kind, value, x in distinguished:
+                        existing = store.add(search, x, kind, value)
+                        if existing is None:
+                            continue
+                        existing_kind, existing_value = existing
+                        if existing_kind != kind:
+                            tame, wild = (value, existing_value) if kind == TAME else (existing_value, value)
+                            key = solve_collision(target, tame, wild)
+                            if key is not None:
+                                store.commit()
+                                logging.info(f"Private key found: {key}")
+                                executor.shutdown(wait=False, cancel_futures=True)
+                                return key
+                        # Same-herd collision: this kangaroo now follows another one's path
+                        herd[lane] = new_kangaroo(kind, target, min_key, width)
+                    store.commit()
+
+                    if jumps_done > GIVE_UP_FACTOR * expected_jumps:
+                        logging.info("Kangaroo search exceeded its expected work; the key is probably not in range.")
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        return None
+                    pending[executor.submit(run_herd, herd, STEPS_PER_TASK)] = None
+
+                now = time.time()
+                if now - last_report >= PROGRESS_INTERVAL:
+                    found_points = store.count(search) - points_at_start
+                    rate = found_points / (now - started)
+                    remaining = max(0, expected_points - store.count(search))
+                    eta = f"{remaining / rate:.0f}s" if rate else "unknown"
+                    logging.info(f"{store.count(search)} distinguished points ({rate:.2f}/s), "
+                                 f"{jumps_done / (now - started):.0f} jumps/s, ETA {eta}.")
+                    last_report = now
+    finally:
+        store.close()
+    return None
+
+
+# Usage: python kangaroo.py <pubkey hex> [min_key] [max_key]
+#        python kangaroo.py merge <store> <other store> [...]
+if __name__ == "__main__":
+    if sys.argv[1] == "merge":
+        merged = DistinguishedPointStore(sys.argv[2])
+        for other in sys.argv[3:]:
+            merged.merge(other)
+            logging.info(f"Merged distinguished points from {other}.")
+        merged.close()
+    else:
+        min_key = int(sys.argv[2]) if len(sys.argv) > 2 else MIN_KEY
+        max_key = int(sys.argv[3]) if len(sys.argv) > 3 else MAX_KEY
+        private_key = search_with_kangaroo(sys.argv[1], min_key, max_key)
+        if private_key:
+            logging.info(f"Success! Private key found: {private_key}")
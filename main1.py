@@ -1,226 +1,233 @@
 import os
-import pickle
-import hashlib
 import json
+import struct
+from itertools import islice
+from checkpoint import Checkpoint
+from hash160_backend import private_keys_to_hash160
+from secp256k1 import N
 
 
-class TreeNode:
-    def __init__(self, min_key, max_key):
-        self.min_key = min_key
-        self.max_key = max_key
-        self.left = None  # Can be a TreeNode or filename
-        self.right = None  # Can be a TreeNode or filename
-        self.file_stored = False  # To track if the node is offloaded to disk
+# Checkpoint with the starting window (min_key, max_key, step_size); the frontier has its own fixed-size record
+CHECKPOINT_FILE = "main1.ckpt"
+DEFAULT_WINDOW = (73786976294838206464, 147573952589676412927, 129)  # Default range and step if no checkpoint exists
+FRONTIER_FILE = "main1.frontier"
+FRONTIER_FORMAT = "<QBQ"  # (pass, depth, index) of the next node to visit: 17 bytes, rewritten in place
 
-    def save_to_file(self, filename):
-        with open(filename, "wb") as f:
-            pickle.dump(self, f)
-        self.file_stored = True
-        self.left = None
-        self.right = None
 
-    @staticmethod
-    def load_from_file(filename):
-        with open(filename, "rb") as f:
-            return pickle.load(f)
+# Read the frontier record, or None if there is none yet
+def load_frontier(path=FRONTIER_FILE):
+    try:
+        with open(path, "rb") as f:
+            data = f.read(struct.calcsize(FRONTIER_FORMAT))
+    except FileNotFoundError:
+        return None
+    return struct.unpack(FRONTIER_FORMAT, data) if len(data) == struct.calcsize(FRONTIER_FORMAT) else None
 
-    def delete_file(self, filename):
-        if os.path.exists(filename):
-            os.remove(filename)
 
+# Overwrite the frontier record in place; a single 17-byte write, cheap enough for every batch
+def save_frontier(pass_index, depth, index, path=FRONTIER_FILE):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        os.pwrite(fd, struct.pack(FRONTIER_FORMAT, pass_index, depth, index), 0)
+    finally:
+        os.close(fd)
 
-# Function to save progress to a file
-def save_progress(min_key, max_key):
-    progress = {'min_key': min_key, 'max_key': max_key}
-    with open('progress.json', 'w') as file:
-        json.dump(progress, file)
 
-# Function to load progress from a file
-def load_progress():
-    try:
+# Function to load progress: the window and the frontier to resume from, taking over an old progress.json once
+def load_progress(checkpoint):
+    window = checkpoint.get("window")
+    if window is None and os.path.exists('progress.json'):
         with open('progress.json', 'r') as file:
             progress = json.load(file)
-            return progress['min_key'], progress['max_key']
-    except FileNotFoundError:
-        return 73786976294838206464, 147573952589676412927  # Default range if no progress file exists
-
-
-from ecdsa import SigningKey, SECP256k1
-import hashlib
-
-
-def private_key_to_hash160(private_key):
-    # Convert the private key to bytes
-    pk_bytes = private_key.to_bytes(32, byteorder="big")
-    
-    # Generate the public key using the SECP256k1 curve
-    signing_key = SigningKey.from_string(pk_bytes, curve=SECP256k1)
-    verifying_key = signing_key.verifying_key
-    
-    # Get the uncompressed public key
-    uncompressed_pubkey = b'\x04' + verifying_key.to_string()
-    
-    # Compress the public key
-    prefix = b'\x02' if uncompressed_pubkey[-1] % 2 == 0 else b'\x03'
-    compressed_pubkey = prefix + verifying_key.to_string()[:32]
-    
-    # Hash the compressed public key: SHA256 followed by RIPEMD160
-    sha256 = hashlib.sha256(compressed_pubkey).digest()
-    ripemd160 = hashlib.new("ripemd160", sha256).digest()
-    
-    # Return the RIPEMD160 hash as a hexadecimal string
-    return ripemd160.hex()
-
-
-
-def build_tree_with_files(min_key, max_key, depth=0, max_depth=4):
-    if min_key > max_key:
-        return None
+        window = (progress['min_key'], progress['max_key'], progress.get('step_size') or DEFAULT_WINDOW[2])
+        save_frontier(progress.get('pass_index', 0), progress.get('depth', 0), progress.get('index', 0))
+    window = window or DEFAULT_WINDOW
+    checkpoint.update("window", *window)
+    checkpoint.flush()  # The frontier record is only meaningful with the window it belongs to
+    return window, load_frontier() or (0, 0, 0)
+
+
+# Levels visited below the root; the old pickled tree kept 4 levels in memory and one more in files
+TREE_DEPTH = 5
+HASH_BATCH = 256  # Midpoints hashed together, checked in traversal order
+
+
+# Key range of the node at (depth, index), found by walking down from the root;
+# bit (depth - 1 - level) of index picks the left (0) or right (1) child at each level
+def node_range(min_key, max_key, depth, index):
+    for level in range(depth - 1, -1, -1):
+        mid_key = (min_key + max_key) // 2
+        if (index >> level) & 1:
+            min_key = mid_key + 1
+        else:
+            max_key = mid_key - 1
+    return min_key, max_key
 
-    root = TreeNode(min_key, max_key)
-    mid_key = (min_key + max_key) // 2
-
-    # Limit in-memory depth to reduce memory usage
-    if depth < max_depth:
-        root.left = build_tree_with_files(min_key, mid_key - 1, depth + 1, max_depth)
-        root.right = build_tree_with_files(mid_key + 1, max_key, depth + 1, max_depth)
-    else:
-        # Save subtrees to files
-        left_file = f"tree_left_{min_key}_{mid_key - 1}.pkl"
-        right_file = f"tree_right_{mid_key + 1}_{max_key}.pkl"
-        root.left = left_file
-        root.right = right_file
-        TreeNode(min_key, mid_key - 1).save_to_file(left_file)
-        TreeNode(mid_key + 1, max_key).save_to_file(right_file)
-
-    return root
-
-
-# def search_tree_with_files(root, target_hash160):
-#     if root is None:
-#         return None
-
-#     if isinstance(root, str):  # Load node from file if needed
-#         root = TreeNode.load_from_file(root)
-
-#     mid_key = (root.min_key + root.max_key) // 2
-#     try:
-#         hash160 = private_key_to_hash160(mid_key)
-#         print(f"\n\n{mid_key}\n{hash160}\n{target_hash160}\n")
-#         # print(f"Checking key {mid_key}: {hash160}")  # Debug output
-#         if hash160 == target_hash160:
-#             return mid_key  # Found the key!
-#     except Exception as e:
-#         print(f"Error processing key {mid_key}: {e}")
-#         return None
-
-#     # Search left subtree
-#     if isinstance(root.left, str):
-#         left_file = root.left
-#         found = search_tree_with_files(TreeNode.load_from_file(left_file), target_hash160)
-#         if found is not None:
-#             return found
-#         os.remove(left_file)  # Delete file after use
-#     else:
-#         found = search_tree_with_files(root.left, target_hash160)
-#         if found is not None:
-#             return found
-
-#     # Search right subtree
-#     if isinstance(root.right, str):
-#         right_file = root.right
-#         found = search_tree_with_files(TreeNode.load_from_file(right_file), target_hash160)
-#         if found is not None:
-#             return found
-#         os.remove(right_file)  # Delete file after use
-#     else:
-#         found = search_tree_with_files(root.right, target_hash160)
-#         if found is not None:
-#             return found
-
-#     return None
-
-
-def search_tree_with_files(root, target_hash160, processed_files=None):
-    if processed_files is None:
-        processed_files = set()  # Keep track of processed files
-
-    if root is None:
+
+# Preorder successor of (depth, index): first child if it may descend, else the next right sibling up the path
+def next_node(depth, index, max_depth, descend):
+    if descend and depth < max_depth:
+        return depth + 1, index * 2
+    while depth > 0 and index & 1:
+        depth, index = depth - 1, index >> 1
+    if depth == 0:
         return None
+    return depth, index + 1
 
-    if isinstance(root, str):  # Load node from file if needed
-        root = TreeNode.load_from_file(root)
 
-    mid_key = (root.min_key + root.max_key) // 2
-    try:
-        hash160 = private_key_to_hash160(mid_key)
-        # print(f"\n\n{mid_key}\n{hash160}\n{target_hash160}\n")
-        if hash160 == target_hash160 or hash160.startswith("739437"):
-            print(f"{hash160}\n{mid_key}")
-            return mid_key  # Found the key!
-    except Exception as e:
-        print(f"Error processing key {mid_key}: {e}")
-        return None
+# Yield (depth, index, mid_key) for every node in midpoint-first preorder (mid, left subtree, right subtree)
+def iterate_midpoints(min_key, max_key, max_depth=TREE_DEPTH, cursor=(0, 0)):
+    node = cursor
+    while node is not None:
+        depth, index = node
+        low, high = node_range(min_key, max_key, depth, index)
+        if low <= high:
+            yield depth, index, (low + high) // 2
+        node = next_node(depth, index, max_depth, low <= high)
 
-    # Search left subtree
-    found = None
-    if isinstance(root.left, str):
-        left_file = root.left
-        found = search_tree_with_files(TreeNode.load_from_file(left_file), target_hash160, processed_files)
-        if found is None:
-            processed_files.add(left_file)  # Mark file as processed
-    else:
-        found = search_tree_with_files(root.left, target_hash160, processed_files)
-
-    # If not found in the left, search right subtree
-    if found is None:
-        if isinstance(root.right, str):
-            right_file = root.right
-            found = search_tree_with_files(TreeNode.load_from_file(right_file), target_hash160, processed_files)
-            if found is None:
-                processed_files.add(right_file)  # Mark file as processed
-        else:
-            found = search_tree_with_files(root.right, target_hash160, processed_files)
 
-    # Delete files that are marked as processed
-    if root.left in processed_files and root.right in processed_files:
-        if isinstance(root.left, str):
-            os.remove(root.left)
-            processed_files.discard(root.left)
-        if isinstance(root.right, str):
-            os.remove(root.right)
-            processed_files.discard(root.right)
+# Window of a pass: both ends move inwards by step_size per pass (outwards when step_size is negative)
+def pass_window(min_key, max_key, step_size, pass_index):
+    return min_key + pass_index * step_size, max_key - pass_index * step_size
 
-    return found
 
+# Frontier right after node (depth, index) of a pass
+def next_frontier(pass_index, depth, index, max_depth=TREE_DEPTH):
+    following = next_node(depth, index, max_depth, True)
+    if following is None:
+        return pass_index + 1, 0, 0
+    return (pass_index,) + following
 
 
-def search_in_expanding_range(target_hash160, initial_min_key, initial_max_key, step_size):
-    min_key = initial_min_key
-    max_key = initial_max_key
-    found = False
+# Midpoint of node (depth, index) in a pass, or None if the node's range is empty there
+def node_midpoint(min_key, max_key, step_size, pass_index, depth, index):
+    low, high = node_range(*pass_window(min_key, max_key, step_size, pass_index), depth, index)
+    return (low + high) // 2 if low <= high else None
 
-    while not found:
-        # print(f"Searching in range: {min_key} to {max_key}")
-        
-        # Search in the current range
-        found = search_tree_with_files(build_tree_with_files(min_key, max_key), target_hash160)
-        
-        if not found:
-            # print(f"Expanding search range by {step_size}")
-            min_key += step_size
-            max_key -= step_size  # Expand both ends of the range
-            save_progress(min_key, max_key)  # Save progress
+
+# Passes in [0, pass_index) in which node (depth, index) is non-empty, as (first, last), or None if there are none
+def active_passes(min_key, max_key, step_size, pass_index, depth, index):
+    # The node is widest in the first pass of a shrinking window and in the latest pass of a growing one
+    widest, outside = (0, pass_index) if step_size > 0 else (pass_index - 1, -1)
+    if node_midpoint(min_key, max_key, step_size, widest, depth, index) is None:
+        return None
+    active, inactive = widest, outside
+    while abs(inactive - active) > 1:
+        middle = (active + inactive) // 2
+        if node_midpoint(min_key, max_key, step_size, middle, depth, index) is None:
+            inactive = middle
+        else:
+            active = middle
+    return (widest, active) if step_size > 0 else (active, widest)
+
+
+# Per-node memo of the keys emitted in passes [0, pass_index):
+# (lowest, highest, depth, index, first active pass, last active pass)
+def node_tracks(min_key, max_key, step_size, max_depth, pass_index):
+    """
+    The root midpoint stays put as the window moves, and every other node
+    lies on one side of it, so the node's range endpoints, and hence its
+    midpoint, move monotonically from pass to pass. Its width does too, so
+    the passes in which a node is non-empty are a run: a prefix of the passes
+    while the window shrinks, a suffix while it grows. The memo is derived
+    from the windows, so it is rebuilt rather than saved.
+    """
+    tracks = []
+    if pass_index == 0:
+        return tracks
+    for depth in range(max_depth + 1):
+        for index in range(1 << depth):
+            passes = active_passes(min_key, max_key, step_size, pass_index, depth, index)
+            if passes is None:
+                continue
+            first_mid, last_mid = (node_midpoint(min_key, max_key, step_size, p, depth, index) for p in passes)
+            tracks.append((min(first_mid, last_mid), max(first_mid, last_mid), depth, index) + passes)
+    return tracks
+
+
+# Add the midpoints of a finished pass to the memo without rebuilding it
+def extend_tracks(tracks, min_key, max_key, step_size, max_depth, pass_index):
+    extended = {track[2:4]: track for track in tracks}
+    for depth, index, mid_key in iterate_midpoints(*pass_window(min_key, max_key, step_size, pass_index), max_depth):
+        # A node without a track has just become non-empty in a growing window (or this is the first pass)
+        new_track = (mid_key, mid_key, depth, index, pass_index, pass_index)
+        low, high, _, _, first_active, _ = extended.get((depth, index), new_track)
+        extended[depth, index] = (min(low, mid_key), max(high, mid_key), depth, index, first_active, pass_index)
+    return list(extended.values())
+
+
+# Whether any node emitted the key in an earlier pass; its monotonic midpoints are binary searched by pass
+def emitted_before(tracks, key, min_key, max_key, step_size):
+    for low, high, depth, index, first_active, last_active in tracks:
+        if not low <= key <= high:
+            continue
+        increasing = node_midpoint(min_key, max_key, step_size, last_active, depth, index) >= high
+        first, last = first_active, last_active
+        while first <= last:
+            middle = (first + last) // 2
+            mid_key = node_midpoint(min_key, max_key, step_size, middle, depth, index)
+            if mid_key == key:
+                return True
+            if (mid_key < key) == increasing:
+                first = middle + 1
+            else:
+                last = middle - 1
+    return False
+
+
+# Yield (pass_index, depth, index, mid_key) for midpoints that no earlier pass has emitted
+def iterate_new_midpoints(min_key, max_key, step_size, max_depth=TREE_DEPTH, frontier=(0, 0, 0)):
+    """
+    Passes run until a shrinking window is empty or a growing one would leave
+    the valid keys [1, N - 1]; a growing window never empties, so it is bounded
+    by the key space instead.
+    """
+    if step_size == 0:  # Every pass after the first would repeat it
+        raise ValueError("step_size must be non-zero")
+    pass_index, depth, index = frontier
+    tracks = None
+    while True:
+        low, high = pass_window(min_key, max_key, step_size, pass_index)
+        if low > high or low < 1 or high >= N:
+            return
+        if tracks is None:
+            tracks = node_tracks(min_key, max_key, step_size, max_depth, pass_index)
+        for node_depth, node_index, mid_key in iterate_midpoints(low, high, max_depth, (depth, index)):
+            if not emitted_before(tracks, mid_key, min_key, max_key, step_size):
+                yield pass_index, node_depth, node_index, mid_key
+        tracks = extend_tracks(tracks, min_key, max_key, step_size, max_depth, pass_index)
+        pass_index, depth, index = pass_index + 1, 0, 0
+
+
+def search_in_expanding_range(target_hash160, initial_min_key, initial_max_key, step_size, frontier=(0, 0, 0),
+                              frontier_path=None):
+    nodes = iterate_new_midpoints(initial_min_key, initial_max_key, step_size, TREE_DEPTH, frontier)
+    while True:
+        batch = list(islice(nodes, HASH_BATCH))
+        if not batch:
+            return None
+        try:
+            hashes = private_keys_to_hash160([mid_key for _, _, _, mid_key in batch])
+        except Exception as e:
+            print(f"Error processing keys {batch[0][3]}..{batch[-1][3]}: {e}")
+            return None
+        for (_, _, _, mid_key), hash160 in zip(batch, hashes):
+            if hash160 == target_hash160 or hash160.startswith("739437"):
+                print(f"{hash160}\n{mid_key}")
+                return mid_key  # Found the key!
+
+        if frontier_path is not None:
+            save_frontier(*next_frontier(*batch[-1][:3]), path=frontier_path)
 
 
 if __name__ == "__main__":
-    # Load the progress from file and start the search
-    min_key, max_key = load_progress()
+    # Load the progress from the checkpoint and start the search
+    checkpoint = Checkpoint(CHECKPOINT_FILE)
+    (min_key, max_key, step_size), frontier = load_progress(checkpoint)
 
     # Set the initial range and step size
     initial_min_key = min_key
     initial_max_key = max_key
-    step_size = 129
     # step_size = max(1, (max_key - min_key))  # Adjust dynamically
 
 
@@ -228,4 +235,5 @@ if __name__ == "__main__":
     target_hash160 = "739437bb3dd6d1983e66629c5f08c70e52769371"  # Example hash160
 
     # Start the expanding search
-    search_in_expanding_range(target_hash160, initial_min_key, initial_max_key, step_size)
+    with checkpoint:
+        search_in_expanding_range(target_hash160, initial_min_key, initial_max_key, step_size, frontier, FRONTIER_FILE)
@@ -0,0 +1,85 @@
+from array import array
+import numpy as np
+
+# Match results, ordered so that any hit is truthy
+MISS = 0
+PREFIX_HIT = 1
+EXACT_HIT = 2
+
+HASH160_SIZE = 20  # Bytes in a raw hash160 digest
+HASH160_HEX_LENGTH = 2 * HASH160_SIZE
+
+
+# Load target hash160s from a file with one hex digest per line
+def load_targets(file_path):
+    with open(file_path, "r") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+class TargetMatcher:
+    """
+    Match raw 20-byte hash160 digests against any number of targets.
+
+    Targets are kept as one sorted byte array with a 2-byte bucket index, and
+    their prefixes (prefix_length hex characters, as in TARGET_HASH160[:PREFIX_LENGTH])
+    as a set of integers. A lookup costs the same for one target or thousands
+    and never builds hex strings.
+    """
+
+    def __init__(self, targets, prefix_length=None):
+        digests = sorted({bytes.fromhex(t) if isinstance(t, str) else bytes(t) for t in targets})
+        if any(len(digest) != HASH160_SIZE for digest in digests):
+            raise ValueError("Targets must be 20-byte hash160 digests")
+        self.prefix_length = HASH160_HEX_LENGTH if prefix_length is None else prefix_length
+        self._prefix_bytes = (self.prefix_length + 1) // 2
+        self._prefix_shift = 4 * (self.prefix_length % 2)
+        self._targets = b"".join(digests)
+        self._prefixes = frozenset(self._prefix_value(digest) for digest in digests)
+
+        # _buckets[b]:_buckets[b + 1] is the slice of targets whose first two bytes equal b
+        self._buckets = array("I", [0]) * 65537
+        for digest in digests:
+            self._buckets[(digest[0] << 8 | digest[1]) + 1] += 1
+        for bucket in range(65536):
+            self._buckets[bucket + 1] += self._buckets[bucket]
+
+    def __len__(self):
+        return len(self._targets) // HASH160_SIZE
+
+    # The targets as sorted 20-byte digests
+    def targets(self):
+        return [self._targets[i:i + HASH160_SIZE] for i in range(0, len(self._targets), HASH160_SIZE)]
+
+    def _prefix_value(self, digest):
+        return int.from_bytes(digest[:self._prefix_bytes], "big") >> self._prefix_shift
+
+    # Exact lookup in the digest's bucket of the sorted target array
+    def is_target(self, digest):
+        bucket = digest[0] << 8 | digest[1]
+        start = self._buckets[bucket] * HASH160_SIZE
+        end = self._buckets[bucket + 1] * HASH160_SIZE
+        position = self._targets.find(digest, start, end)
+        while position != -1 and position % HASH160_SIZE:
+            position = self._targets.find(digest, position + 1, end)
+        return position != -1
+
+    # Return MISS, PREFIX_HIT or EXACT_HIT for one digest
+    def match(self, digest):
+        if self._prefix_value(digest) not in self._prefixes:
+            return MISS
+        return EXACT_HIT if self.is_target(digest) else PREFIX_HIT
+
+    # Match a batch of digests: an (N, 20) uint8 array or any iterable of 20-byte digests
+    def match_batch(self, digests):
+        if not isinstance(digests, np.ndarray) or self._prefix_bytes > 8:
+            return [self.match(bytes(digest)) for digest in digests]
+        values = np.zeros(len(digests), dtype=np.uint64)
+        for column in range(self._prefix_bytes):
+            values = (values << np.uint64(8)) | digests[:, column].astype(np.uint64)
+        values >>= np.uint64(self._prefix_shift)
+        prefixes = np.fromiter(self._prefixes, dtype=np.uint64, count=len(self._prefixes))
+        results = np.isin(values, prefixes).astype(np.uint8)
+        for row in np.flatnonzero(results):
+            if self.is_target(digests[row].tobytes()):
+                results[row] = EXACT_HIT
+        return results
@@ -0,0 +1,284 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from workerpool import get_context, get_worker_state
+
+try:
+    import psutil
+except ImportError:  # RSS/CPU are left out of the metrics without it
+    psutil = None
+
+# Constants
+METRICS_PORT = 9108  # Local Prometheus endpoint: http://127.0.0.1:9108/metrics
+METRICS_PORT_ENV = "SEARCH_METRICS_PORT"  # Overrides the port: 0 picks a free one, "off" disables the endpoint
+SAMPLE_INTERVAL = 1  # Seconds between samples of the totals for the rolling rates
+RATE_WINDOWS = (10, 60, 300)  # Seconds covered by each rolling keys/s rate
+ETA_WINDOW = 60  # The ETA uses the rate over this window
+SUMMARY_INTERVAL = 30  # Seconds between summary log lines
+COUNTERS = ("keys", "prefix_hits", "ranges", "covered")  # covered: progress through the configured total
+
+
+# The port from METRICS_PORT_ENV if it is set, else `port` (None: no endpoint, also when the setting is malformed)
+def metrics_port(port=METRICS_PORT, report=logging.info):
+    value = os.environ.get(METRICS_PORT_ENV, "").strip()
+    if not value:
+        return port
+    if value.lower() == "off":
+        return None
+    try:
+        port = int(value)
+        if not 0 <= port <= 65535:
+            raise ValueError(f"port {port} out of range")
+    except ValueError as e:
+        report(f"Metrics endpoint disabled, {METRICS_PORT_ENV}={value!r} is not a port number: {e}")
+        return None
+    return port
+
+
+class Metrics:
+    """
+    Live counters for a running search. Every worker process gets its own row
+    of int64 counters in shared memory and is its only writer, so add() needs
+    no cross-process lock; the parent (and its threads) use row 0. Workers
+    call add() once per range or batch, not per key, which keeps the cost
+    negligible.
+
+    In the parent, start() runs a sampler thread that keeps the rolling
+    keys/s rates and ETA, logs a summary line every SUMMARY_INTERVAL seconds,
+    and serves the counters, rates, gauges and psutil RSS/CPU in Prometheus
+    text format on 127.0.0.1:port/metrics. Hand it to workers with
+    create_process_pool(..., metrics=metrics). Set SEARCH_METRICS_PORT to run
+    several searches on one host; if the port is taken anyway, or the setting
+    is not a port number, the search goes on without the endpoint.
+    """
+
+    def __init__(self, total=None, completed=0, slots=None, port=METRICS_PORT, summary_interval=SUMMARY_INTERVAL,
+                 report=logging.info):
+        self.total = total  # Size of the configured range for the ETA, in the units of `covered` (keys, or ranges)
+        self.completed = completed  # Part of it already done before this run
+        self.slots = slots or os.cpu_count() + 1
+        self.summary_interval = summary_interval
+        self.report = report  # Where summary lines go (print for the scanners that do not log)
+        self.port = metrics_port(port, report)
+        context = get_context()
+        self.counts = context.RawArray("q", self.slots * len(COUNTERS))
+        self.next_slot = context.Value("i", 1)
+        self.gauges = {}
+        self._init_local()
+
+    # Process-local state; workers start from here after registering
+    def _init_local(self):
+        self.slot = 0
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=max(RATE_WINDOWS) // SAMPLE_INTERVAL + 1)
+        self._processes = {}
+        self._stop = threading.Event()
+        self._threads = []
+        self._server = None
+
+    def __getstate__(self):
+        # Spawned workers get the settings and shared counters, not the parent's threads or gauges
+        state = {name: value for name, value in self.__dict__.items() if not name.startswith("_")}
+        state["gauges"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_local()
+
+    # Claim a counter row for this worker process (called by the pool initializer)
+    def register(self):
+        with self.next_slot.get_lock():
+            index = self.next_slot.value
+            self.next_slot.value += 1
+        if self._server is not None:  # A forked worker inherits the parent's listening socket; let go of the port
+            self._server.socket.close()
+        # More workers than rows (e.g. a replaced worker) share a row; the totals stay right
+        self._init_local()
+        self.slot = 1 + (index - 1) % (self.slots - 1)
+
+    def add(self, keys=0, prefix_hits=0, ranges=0, covered=None):
+        base = self.slot * len(COUNTERS)
+        with self._lock:
+            self.counts[base] += keys
+            self.counts[base + 1] += prefix_hits
+            self.counts[base + 2] += ranges
+            self.counts[base + 3] += keys if covered is None else covered
+
+    # Report a value computed on demand, e.g. queue depth or checkpoint latency
+    def gauge(self, name, function):
+        self.gauges[name] = function
+
+    def per_worker(self):
+        width = len(COUNTERS)
+        return [dict(zip(COUNTERS, self.counts[slot * width:(slot + 1) * width])) for slot in range(self.slots)]
+
+    def totals(self):
+        totals = dict.fromkeys(COUNTERS, 0)
+        for counts in self.per_worker():
+            for name, value in counts.items():
+                totals[name] += value
+        return totals
+
+    def _sample(self):
+        totals = self.totals()
+        self._samples.append((time.monotonic(), totals["keys"], totals["covered"]))
+
+    # Counter increase per second over the last `window` seconds
+    def rate(self, window, counter="keys"):
+        samples = list(self._samples)  # The sampler thread appends while the endpoint reads
+        if len(samples) < 2:
+            return 0.0
+        index = 1 if counter == "keys" else 2
+        now = samples[-1]
+        oldest = next((sample for sample in samples if sample[0] >= now[0] - window), samples[0])
+        elapsed = now[0] - oldest[0]
+        return (now[index] - oldest[index]) / elapsed if elapsed > 0 else 0.0
+
+    # Seconds until the configured range is covered at the recent rate
+    def eta(self):
+        if self.total is None:
+            return None
+        rate = self.rate(ETA_WINDOW, "covered")
+        if not rate:
+            return None
+        return max(0, self.total - self.completed - self.totals()["covered"]) / rate
+
+    # RSS and CPU of this process and its workers
+    def resources(self):
+        if psutil is None:
+            return {}
+        main = psutil.Process()
+        rss = cpu = 0
+        alive = {}
+        for process in [main] + main.children(recursive=True):
+            # Keep each Process object, so cpu_percent() measures since the previous call
+            process = self._processes.get(process.pid, process)
+            try:
+                rss += process.memory_info().rss
+                cpu += process.cpu_percent(None)
+            except psutil.Error:
+                continue
+            alive[process.pid] = process
+        self._processes = alive
+        return {"resident_memory_bytes": rss, "cpu_percent": cpu}
+
+    def _gauge_values(self):
+        values = {}
+        for name, function in self.gauges.items():
+            try:
+                values[name] = function()
+            except Exception as e:  # A broken gauge must not take the search down
+                logging.debug(f"Metrics gauge {name} failed: {e}")
+        return values
+
+    def prometheus(self):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP search_{name} {help_text}")
+            lines.append(f"# TYPE search_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"search_{name}{labels} {value}")
+
+        workers = self.per_worker()
+        for counter, help_text in (("keys", "Keys hashed."), ("prefix_hits", "Prefix hits."),
+                                   ("ranges", "Ranges completed."),
+                                   ("covered", "Progress through the configured range.")):
+            metric(f"{counter}_total", "counter", help_text,
+                   [(f'{{worker="{slot}"}}', counts[counter]) for slot, counts in enumerate(workers)])
+        metric("keys_per_second", "gauge", "Keys hashed per second over a rolling window.",
+               [(f'{{window="{window}s"}}', self.rate(window)) for window in RATE_WINDOWS])
+        eta = self.eta()
+        if eta is not None:
+            metric("eta_seconds", "gauge", "Estimated seconds until the configured range is covered.", [("", eta)])
+        for name, value in {**self._gauge_values(), **self.resources()}.items():
+            metric(name, "gauge", name.replace("_", " ").capitalize() + ".", [("", value)])
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        totals = self.totals()
+        parts = [f"{totals['keys']:,} keys",
+                 f"{self.rate(RATE_WINDOWS[0]):,.0f} keys/s ({RATE_WINDOWS[0]}s), "
+                 f"{self.rate(RATE_WINDOWS[1]):,.0f} ({RATE_WINDOWS[1]}s)",
+                 f"{totals['prefix_hits']} prefix hits", f"{totals['ranges']:,} ranges"]
+        parts += [f"{name} {value:,.3g}" for name, value in self._gauge_values().items()]
+        resources = self.resources()
+        if resources:
+            parts.append(f"RSS {resources['resident_memory_bytes'] / 2 ** 20:,.0f} MB, "
+                         f"CPU {resources['cpu_percent']:.0f}%")
+        eta = self.eta()
+        if self.total is not None:
+            parts.append(f"ETA {eta:,.0f}s" if eta is not None else "ETA unknown")
+        return " | ".join(parts)
+
+    def _run_sampler(self):
+        last_summary = time.monotonic()
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self._sample()
+            if self.summary_interval and time.monotonic() - last_summary >= self.summary_interval:
+                self.report(self.summary())
+                last_summary = time.monotonic()
+
+    def start(self):
+        self._sample()
+        threads = [threading.Thread(target=self._run_sampler, daemon=True)]
+        if self.port is not None:
+            try:
+                self._server = ThreadingHTTPServer(("127.0.0.1", self.port), MetricsHandler)
+            except OSError as e:  # e.g. another search already serves on this port
+                self.report(f"Metrics endpoint disabled, cannot listen on port {self.port}: {e} "
+                            f"(set {METRICS_PORT_ENV} to another port, 0 or off)")
+            else:
+                self._server.metrics = self
+                threads.append(threading.Thread(target=self._server.serve_forever, daemon=True))
+                self.report(f"Metrics at http://127.0.0.1:{self._server.server_address[1]}/metrics")
+        for thread in threads:
+            thread.start()
+        self._threads = threads
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._sample()
+        self.report(self.summary())
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        data = self.server.metrics.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Add to the calling worker's counters, if its pool was given a Metrics
+def record(keys=0, prefix_hits=0, ranges=0, covered=None):
+    metrics = get_worker_state("metrics", None)
+    if metrics is not None:
+        metrics.add(keys, prefix_hits, ranges, covered)
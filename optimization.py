@@ -1,90 +1,135 @@
 import os
-import pickle
 import logging
-from concurrent.futures import ThreadPoolExecutor
-from main1 import private_key_to_hash160
+from functools import partial
+from cancellation import CancellationToken, Cancelled, checked
+from coverage_ledger import CoverageLedger, ledger_path
+from matcher import EXACT_HIT, TargetMatcher
+from metrics import Metrics, record
+from secp256k1 import iterate_segment
+from workerpool import create_process_pool, get_worker_state, map_in_chunks
+from workqueue import WorkQueue
 
 # Constants
 # MIN_KEY = 73786976294838206464
 # MAX_KEY = 147573952589676412927
 # STEP_SIZE = 1234567890
-FILES_DIR = "key_ranges"
+QUEUE_FILE = "work_queue.sqlite"
 
 # for example
 MIN_KEY = 737731
 MAX_KEY = 14752454
 STEP_SIZE = 100
+REFERENCE_HASH160 = False  # Scan ranges with the ecdsa reference backend to cross-check the batched engine
+
+LEASE_BATCH = 16  # Ranges claimed per lease transaction
+LEDGER_SAVE_INTERVAL = 256  # Completed ranges between coverage ledger saves
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
 
-# Create a directory for storing files
-os.makedirs(FILES_DIR, exist_ok=True)
-
-# Step 1: Save ranges to files
-def save_ranges_to_files(min_key, max_key, step_size):
-    current_key = min_key
-    file_index = 1
-
-    while current_key <= max_key:
-        range_end = min(current_key + step_size - 1, max_key)
-        file_name = os.path.join(FILES_DIR, f"range_{file_index}.pkl")
-        
-        # Save range metadata
-        with open(file_name, "wb") as f:
-            pickle.dump({"range": (current_key, range_end)}, f)
-        
-        logging.info(f"Saved range {current_key} to {range_end} in {file_name}")
-        current_key += step_size
-        file_index += 1
-
-    logging.info(f"Saved {file_index - 1} files in {FILES_DIR} directory.")
-
-# Step 2: Process each file
-def process_file(file_path, target_hash160, process_function):
-    logging.info(f"Processing file: {file_path}")
-    with open(file_path, "rb") as f:
-        data = pickle.load(f)
-        start, end = data["range"]
-
-    # Process the range
-    for key in range(start, end + 1):
-        if process_function(key, target_hash160):
+# Step 1: Enqueue ranges into the work queue
+def enqueue_ranges(min_key, max_key, step_size, targets, queue_path=QUEUE_FILE):
+    ledger = CoverageLedger(ledger_path(targets))
+    queue = WorkQueue(queue_path)
+    # Only the parts that no earlier run has scanned are queued
+    count = queue.enqueue(piece for start in range(min_key, max_key + 1, step_size)
+                          for piece in ledger.subtract(start, min(start + step_size - 1, max_key)))
+    queue.close()
+    logging.info(f"Queued {count} ranges in {queue_path}.")
+
+# Step 2: Process one range
+def process_range(start, end, matcher, process_function, reference=REFERENCE_HASH160, token=None):
+    for key, _, digest in checked(iterate_segment(start, end, reference=reference), token):
+        if process_function(key, digest, matcher):
             logging.info(f"Found matching key: {key}")
             return key
-
-    # Delete file after processing
-    os.remove(file_path)
-    logging.info(f"Deleted processed file: {file_path}")
     return None
 
-# Parallel processing of files
-def process_files_parallel(target_hash160, process_function, max_workers=8):
-    file_paths = [os.path.join(FILES_DIR, file) for file in os.listdir(FILES_DIR)]
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        results = executor.map(lambda path: process_file(path, target_hash160, process_function), file_paths)
-
-    for result in results:
-        if result:  # Found the key
-            logging.info(f"Found matching key: {result}")
-            break
-    else:
+# Worker loop: lease ranges until the queue is drained or some worker has found the key
+def process_leases(worker_index, matcher, process_function, queue_path=QUEUE_FILE):
+    queue = WorkQueue(queue_path)  # One connection per process, opened after the fork
+    ledger = CoverageLedger(ledger_path(matcher.targets()))
+    owner = f"{os.uname().nodename}:{os.getpid()}:{worker_index}"
+    token = get_worker_state("cancellation", None)
+    completed = 0
+    leases = []
+    try:
+        while queue.found_key() is None:
+            leases = queue.lease(owner, LEASE_BATCH)
+            if not leases:
+                return None
+            while leases:
+                range_id, start, end = leases[0]
+                key = process_range(start, end, matcher, process_function, token=token)
+                queue.complete(range_id, key)
+                leases.pop(0)
+                record(keys=end - start + 1, ranges=1, covered=1)  # The ETA counts queued ranges
+                if key is not None:
+                    if token is not None:
+                        token.cancel()  # Stop the other workers mid-range
+                    return key
+                # Record the scanned range (the ledger merges concurrent saves under a lock)
+                ledger.add(start, end)
+                completed += 1
+                if completed % LEDGER_SAVE_INTERVAL == 0:
+                    ledger.save()
+        return queue.found_key()
+    except Cancelled:  # Another worker found the key
+        return None
+    finally:
+        for range_id, _, _ in leases:  # Hand back ranges left unscanned
+            queue.release(range_id)
+        ledger.save()
+        queue.close()
+
+# Parallel processing of the queued ranges
+def process_queue_parallel(matcher, process_function, max_workers=8, queue_path=QUEUE_FILE):
+    queue = WorkQueue(queue_path)  # For the queue depth gauge
+    counts = queue.counts()
+    metrics = Metrics(total=sum(counts.values()), completed=counts["done"], slots=max_workers + 1)
+    metrics.gauge("queue_depth", lambda: queue.counts()["pending"])
+    token = CancellationToken()
+    try:
+        with metrics, create_process_pool(max_workers, cancellation=token, metrics=metrics) as executor:
+            results = map_in_chunks(
+                executor,
+                partial(process_leases, matcher=matcher, process_function=process_function, queue_path=queue_path),
+                range(max_workers),
+                chunksize=1,  # One lease loop per worker
+            )
+
+            try:
+                for result in results:
+                    if result:  # Found the key
+                        logging.info(f"Found matching key: {result}")
+                        return result
+            finally:
+                token.cancel()  # On an interrupt, workers release their leases instead of finishing the ranges
         logging.info("Search completed, target not found.")
+        return None
+    finally:
+        queue.close()
 
 # Example process function
-def example_process_function(key, target_hash160):
-    # Replace this stub with the actual hash160 computation
-    hash160 = private_key_to_hash160(key)  # Implement this function!
-    return hash160 == target_hash160
+def example_process_function(key, digest, matcher):
+    # digest is the raw hash160 computed by the range iterator
+    return matcher.match(digest) == EXACT_HIT
 
 # Main Execution
 if __name__ == "__main__":
-    # Step 1: Save ranges to files
-    save_ranges_to_files(MIN_KEY, MAX_KEY, STEP_SIZE)
-
-    # Step 2: Process files to find the key
     # target_hash = "739437bb3dd6d1983e66629c5f08c70e52769371"
 
     #for example
     target_hash = "5999a923401bd311e7e4a9dfa51576259e076016"
-    process_files_parallel(target_hash, example_process_function, max_workers=8)
+
+    # Step 1: Queue the ranges, unless a previous run already did (leases left by a crash expire on their own)
+    queue = WorkQueue(QUEUE_FILE)
+    counts = queue.counts()
+    queue.close()
+    if not any(counts.values()):
+        enqueue_ranges(MIN_KEY, MAX_KEY, STEP_SIZE, [target_hash])
+    else:
+        logging.info(f"Resuming queue {QUEUE_FILE}: {counts}")
+
+    # Step 2: Process queued ranges to find the key
+    process_queue_parallel(TargetMatcher([target_hash]), example_process_function, max_workers=8)
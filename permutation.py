@@ -0,0 +1,141 @@
+import os
+import fcntl
+import random
+import struct
+import hashlib
+from checkpoint import Checkpoint
+
+# Constants
+ROUNDS = 4  # Feistel rounds; four rounds of a keyed PRF give a pseudo-random permutation
+SAMPLER_DIR = "samplers"
+
+
+class KeyPermutation:
+    """
+    Keyed pseudo-random permutation of [min_key, max_key].
+
+    A balanced Feistel network with a BLAKE2b round function permutes the
+    smallest even-width power-of-two domain that holds the range, and cycle
+    walking re-encrypts until the value lands inside it. The domain is less
+    than four times the range, so that takes under four evaluations on
+    average. Counter i always maps to the same key, and distinct counters map
+    to distinct keys, so draws are unique and resumable from the counter alone.
+    """
+
+    def __init__(self, min_key, max_key, seed=None, rounds=ROUNDS):
+        self.min_key = min_key
+        self.max_key = max_key
+        self.size = max_key - min_key + 1
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.rounds = rounds
+        bits = max(2, (self.size - 1).bit_length())
+        self.half_bits = (bits + 1) // 2
+        self.half_mask = (1 << self.half_bits) - 1
+        self.half_bytes = (self.half_bits + 7) // 8
+        self.round_keys = [
+            hashlib.blake2b(struct.pack("<QI", self.seed, i), digest_size=16).digest() for i in range(rounds)
+        ]
+
+    def __len__(self):
+        return self.size
+
+    # Keyed PRF of one half-block for a round
+    def _round(self, index, value):
+        digest = hashlib.blake2b(value.to_bytes(self.half_bytes, "little"), digest_size=self.half_bytes + 1,
+                                 key=self.round_keys[index]).digest()
+        return int.from_bytes(digest, "little") & self.half_mask
+
+    def _encrypt(self, value):
+        left, right = value >> self.half_bits, value & self.half_mask
+        for index in range(self.rounds):
+            left, right = right, left ^ self._round(index, right)
+        return (left << self.half_bits) | right
+
+    # The counter-th key of the permutation, for 0 <= counter < size
+    def key_at(self, counter):
+        if not 0 <= counter < self.size:
+            raise ValueError(f"Counter {counter} is outside the permutation of {self.size} keys")
+        value = self._encrypt(counter)
+        while value >= self.size:  # Cycle walking
+            value = self._encrypt(value)
+        return self.min_key + value
+
+    # Keys for counters [start, start + count), clipped to the end of the permutation
+    def keys(self, start, count):
+        return [self.key_at(counter) for counter in range(start, min(start + count, self.size))]
+
+
+# Number of keys adaptive sampling draws at most: initial, initial*growth, ... up to max_samples
+def sampling_budget(initial_samples, growth_factor, max_samples):
+    total, samples = 0, initial_samples
+    while samples <= max_samples:
+        total += samples
+        samples *= growth_factor
+    return total
+
+
+class PermutationSampler:
+    """
+    Draws keys without replacement from a KeyPermutation, remembering the seed
+    and the next counter in a checkpoint per key range. Every script sampling
+    the same range shares that checkpoint, so load, reserve and save each read,
+    update and write it under a file lock (as CoverageLedger.save does): a
+    reservation is on disk before its keys are handed out, and concurrent runs
+    never get overlapping counters. A crash skips the unchecked part of its
+    last reservation rather than drawing it twice.
+    """
+
+    def __init__(self, permutation, counter=0, checkpoint=None):
+        self.permutation = permutation
+        self.counter = counter
+        self.checkpoint = checkpoint
+
+    # Resume the sampler for a key range, or start one with a fresh seed
+    @classmethod
+    def load(cls, min_key, max_key, directory=SAMPLER_DIR):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"sampler_{min_key}_{max_key}.ckpt")
+        with open(path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            checkpoint = Checkpoint(path)
+            seed, counter = checkpoint.get("sampler", (None, 0))
+            sampler = cls(KeyPermutation(min_key, max_key, seed), counter, checkpoint)
+            if seed is None:
+                sampler._write()  # Runs that start later use the same seed
+        return sampler
+
+    def _write(self):
+        self.checkpoint.update("sampler", self.permutation.seed, self.counter)
+        self.checkpoint.save()
+
+    # Under the lock: catch up with counters other runs reserved since we last looked, then apply `advance`
+    def _synchronized(self, advance):
+        with open(self.checkpoint.path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            _, saved = Checkpoint(self.checkpoint.path).get("sampler", (None, 0))
+            self.counter = max(self.counter, saved)
+            start = self.counter
+            self.counter = advance(start)
+            self._write()
+        return start
+
+    def save(self):
+        if self.checkpoint is None:
+            return
+        self._synchronized(lambda counter: counter)
+
+    def remaining(self):
+        return self.permutation.size - self.counter
+
+    # Reserve `count` counters and return their starting counter
+    def reserve(self, count):
+        advance = lambda start: min(start + count, self.permutation.size)
+        if self.checkpoint is None:
+            start = self.counter
+            self.counter = advance(start)
+            return start
+        return self._synchronized(advance)
+
+    # The next `count` unique keys
+    def draw(self, count):
+        return self.permutation.keys(self.reserve(count), count)
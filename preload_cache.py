@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import fcntl
+import numpy as np
+from blockedbloom import BlockedBloomFilter
+from hash160_backend import hash160_array
+from matcher import HASH160_SIZE
+from permutation import KeyPermutation
+
+# Constants
+PRELOAD_DIR = "preload"
+PRELOAD_SEED = 0  # Fixed, so every run and every scanner draws (and reuses) the same sample keys
+EXTEND_BATCH = 65536  # Sample digests computed and appended per batch
+
+
+class PreloadCache:
+    """
+    On-disk cache of the random-sample digests the scanners preload into their
+    Bloom filter or hash set.
+
+    Sample i of a key range is key i of a seeded KeyPermutation of the range,
+    so the digests depend only on (range, seed) and are stored once, appended
+    to a flat file of raw 20-byte digests. Asking for more samples than are
+    cached hashes only the missing ones; asking for fewer reads a prefix of
+    the file. Appends take a file lock, so concurrent runs extend the cache
+    without duplicating or interleaving work.
+
+    Finished Bloom filters are cached next to the digests, keyed by (prefix
+    length, size, error rate), and loaded memory-mapped read-only, so a warm
+    start costs one open() and forked workers share the filter's pages.
+    """
+
+    def __init__(self, min_key, max_key, seed=PRELOAD_SEED, directory=PRELOAD_DIR):
+        self.min_key = min_key
+        self.max_key = max_key
+        self.seed = seed
+        self.directory = directory
+        self.name = f"{min_key}_{max_key}_{seed}"
+        self.path = os.path.join(directory, f"digests_{self.name}.bin")
+
+    # Complete digests in the file; a torn final record from a crash is ignored
+    def cached(self):
+        try:
+            return os.path.getsize(self.path) // HASH160_SIZE
+        except FileNotFoundError:
+            return 0
+
+    # Hash and append samples until at least `count` are cached
+    def extend(self, count):
+        if self.cached() >= count:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        permutation = KeyPermutation(self.min_key, self.max_key, self.seed)
+        count = min(count, permutation.size)
+        with open(self.path, "ab") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)  # Another run may have extended the file while we waited
+            try:
+                cached = os.fstat(f.fileno()).st_size // HASH160_SIZE
+                f.truncate(cached * HASH160_SIZE)
+                while cached < count:
+                    keys = permutation.keys(cached, min(EXTEND_BATCH, count - cached))
+                    f.write(hash160_array(keys).tobytes())
+                    f.flush()
+                    cached += len(keys)
+                os.fsync(f.fileno())
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # The first `count` sample digests as an (N, 20) uint8 array
+    def digests(self, count):
+        self.extend(count)
+        digests = np.fromfile(self.path, dtype=np.uint8, count=count * HASH160_SIZE)
+        return digests.reshape(-1, HASH160_SIZE)
+
+    # Hex prefixes of the first `count` samples, as hashset.py uses them
+    def hash_set(self, count, prefix_length):
+        return {digest.hex()[:prefix_length] for digest in map(bytes, self.digests(count))}
+
+    def bloom_filter_path(self, size, error_rate, prefix_length):
+        return os.path.join(self.directory, f"bloom_{self.name}_{prefix_length or 'full'}_{size}_{error_rate}.bbf")
+
+    # A Bloom filter holding the first `size` samples, built once and then mapped read-only
+    def bloom_filter(self, size, error_rate, prefix_length=None):
+        path = self.bloom_filter_path(size, error_rate, prefix_length)
+        if os.path.exists(path):
+            try:
+                return BlockedBloomFilter.load(path)
+            except ValueError:  # An older filter format: rebuild it
+                pass
+        digests = self.digests(size)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        bloom_filter = BlockedBloomFilter(size, error_rate, prefix_length, path=temporary)
+        bloom_filter.add_many(digests)
+        bloom_filter.flush()
+        del bloom_filter  # Unmap before the rename
+        os.replace(temporary, path)  # Readers never see a half-built filter
+        return BlockedBloomFilter.load(path)
+
+
+# Usage: python preload_cache.py <min key> <max key> <samples> [seed]  (fills the cache ahead of a run)
+if __name__ == "__main__":
+    cache = PreloadCache(int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[4]) if len(sys.argv) > 4 else PRELOAD_SEED)
+    count = int(sys.argv[3])
+    before = cache.cached()
+    started = time.perf_counter()
+    cache.extend(count)
+    print(f"{cache.cached()} samples cached in {cache.path} ({max(0, count - before)} hashed in "
+          f"{time.perf_counter() - started:.2f}s)")
@@ -0,0 +1,54 @@
+import sys
+
+
+class RangeSource:
+    """
+    Lazily yields the (start, end) sub-ranges of [min_key, max_key], step_size
+    keys at a time and minus whatever the coverage ledger already covers, so a
+    search over the whole puzzle range holds one range at a time instead of
+    ~10^10 tuples. The cursor is the first key whose range has not been
+    consumed yet; with a checkpoint, advance() records it as results come in
+    and a restarted search over the same range and step resumes from it.
+    """
+
+    def __init__(self, min_key, max_key, step_size, ledger=None, checkpoint=None, name="ranges"):
+        self.min_key = min_key
+        self.max_key = max_key
+        self.step_size = step_size
+        self.ledger = ledger
+        self.checkpoint = checkpoint
+        self.name = name
+        saved = checkpoint.get(name) if checkpoint is not None else None
+        self.cursor = saved[3] if saved and saved[:3] == (min_key, max_key, step_size) else min_key
+
+    def __iter__(self):
+        # Ranges stay aligned to min_key; only the first one is clipped to the cursor
+        first = self.cursor - (self.cursor - self.min_key) % self.step_size
+        for start in range(first, self.max_key + 1, self.step_size):
+            start, end = max(start, self.cursor), min(start + self.step_size - 1, self.max_key)
+            if self.ledger is None:
+                yield start, end
+            else:
+                yield from self.ledger.subtract(start, end)
+
+    # Mark everything up to `end` as consumed
+    def advance(self, end):
+        self.cursor = end + 1
+        if self.checkpoint is not None:
+            self.checkpoint.update(self.name, self.min_key, self.max_key, self.step_size, self.cursor, work=1)
+
+    # Fraction of the range behind the cursor
+    def progress(self):
+        return (self.cursor - self.min_key) / (self.max_key - self.min_key + 1)
+
+
+# Usage: python rangesource.py <checkpoint file> [name]  (prints the saved cursor)
+if __name__ == "__main__":
+    from checkpoint import Checkpoint
+    saved = Checkpoint(sys.argv[1]).get(sys.argv[2] if len(sys.argv) > 2 else "ranges")
+    if saved is None:
+        print("No saved cursor.")
+    else:
+        min_key, max_key, step_size, cursor = saved
+        print(f"[{min_key}, {max_key}] step {step_size}: next key {cursor} "
+              f"({100 * (cursor - min_key) / (max_key - min_key + 1):.6f}% done)")
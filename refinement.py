@@ -0,0 +1,79 @@
+import sys
+from bisect import bisect_left, bisect_right
+
+
+class RefinementPlan:
+    """
+    Union of the refinement windows [key - radius, key + radius] around
+    promising keys, clamped to [min_key, max_key].
+
+    Windows are merged as they are added into sorted, disjoint closed
+    intervals (overlapping and adjacent windows fold together, as in
+    CoverageLedger), so a key inside several windows appears once. Each
+    interval's priority is the sum of the priorities of the keys whose windows
+    it absorbed, by default the number of promising keys in the cluster.
+    stream() yields the intervals densest cluster first, minus what a coverage
+    ledger already holds and cut into scan-sized pieces, so every key in the
+    union is hashed exactly once.
+    """
+
+    def __init__(self, min_key, max_key, radius):
+        self.min_key = min_key
+        self.max_key = max_key
+        self.radius = radius
+        self.starts = []
+        self.ends = []
+        self.priorities = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends)
+
+    # Add the window around `key`, merging it with every interval it overlaps or touches
+    def add(self, key, priority=1):
+        start, end = max(key - self.radius, self.min_key), min(key + self.radius, self.max_key)
+        if start > end:
+            return
+        first = bisect_left(self.ends, start - 1)
+        last = bisect_right(self.starts, end + 1)
+        if first < last:
+            start = min(start, self.starts[first])
+            end = max(end, self.ends[last - 1])
+            priority += sum(self.priorities[first:last])
+        self.starts[first:last] = [start]
+        self.ends[first:last] = [end]
+        self.priorities[first:last] = [priority]
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    # Keys in the union of the windows
+    def key_count(self):
+        return sum(end - start + 1 for start, end in self)
+
+    # (start, end, priority) of each interval by descending priority; ties keep key order
+    def ordered(self):
+        return sorted(zip(self.starts, self.ends, self.priorities), key=lambda interval: -interval[2])
+
+    # Yield the intervals to scan in priority order, minus the ledger, in pieces of at most max_length keys
+    def stream(self, ledger=None, max_length=None):
+        for start, end, _ in self.ordered():
+            # The ledger is consulted as the stream reaches each interval, so pieces recorded meanwhile are skipped
+            for piece_start, piece_end in (ledger.subtract(start, end) if ledger is not None else [(start, end)]):
+                step = max_length or piece_end - piece_start + 1
+                for first in range(piece_start, piece_end + 1, step):
+                    yield first, min(first + step - 1, piece_end)
+
+
+# Usage: python refinement.py <radius> <key> [key ...]  (prints the merged plan)
+if __name__ == "__main__":
+    radius, keys = int(sys.argv[1]), [int(key) for key in sys.argv[2:]]
+    plan = RefinementPlan(0, max(keys) + radius, radius)
+    plan.update(keys)
+    print(f"{len(keys)} windows ({len(keys) * (2 * radius + 1)} keys) -> {len(plan)} intervals "
+          f"({plan.key_count()} keys)")
+    for start, end, priority in plan.ordered():
+        print(f"[{start}, {end}] priority {priority}")
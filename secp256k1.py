@@ -0,0 +1,291 @@
+import hashlib
+from hashbatch import hash160_many, ripemd160
+
+# secp256k1 curve parameters
+P = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+GX = 0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798
+GY = 0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8
+G = (GX, GY)
+
+
+# Add two affine points (None is the point at infinity)
+def point_add(p1, p2):
+    if p1 is None:
+        return p2
+    if p2 is None:
+        return p1
+    x1, y1 = p1
+    x2, y2 = p2
+    if x1 == x2:
+        if (y1 + y2) % P == 0:
+            return None
+        return point_double(p1)
+    slope = (y2 - y1) * pow(x2 - x1, -1, P) % P
+    x3 = (slope * slope - x1 - x2) % P
+    return x3, (slope * (x1 - x3) - y1) % P
+
+
+# Double an affine point
+def point_double(point):
+    if point is None:
+        return None
+    x, y = point
+    if y == 0:
+        return None
+    slope = 3 * x * x * pow(2 * y, -1, P) % P
+    x3 = (slope * slope - 2 * x) % P
+    return x3, (slope * (x - x3) - y) % P
+
+
+# Multiply a point by a scalar with double-and-add
+def point_multiply(scalar, point=G):
+    result = None
+    addend = point
+    while scalar:
+        if scalar & 1:
+            result = point_add(result, addend)
+        addend = point_double(addend)
+        scalar >>= 1
+    return result
+
+
+
+# Double a Jacobian point (X, Y, Z) with x = X / Z^2, y = Y / Z^3
+def jacobian_double(point):
+    if point is None:
+        return None
+    x, y, z = point
+    if y == 0:
+        return None
+    a = x * x % P
+    b = y * y % P
+    c = b * b % P
+    d = 2 * ((x + b) * (x + b) - a - c) % P
+    e = 3 * a % P
+    x3 = (e * e - 2 * d) % P
+    return x3, (e * (d - x3) - 8 * c) % P, 2 * y * z % P
+
+
+# Add an affine point to a Jacobian point (mixed addition, no inversion)
+def jacobian_add_affine(point, affine):
+    if affine is None:
+        return point
+    if point is None:
+        return affine[0], affine[1], 1
+    x1, y1, z1 = point
+    x2, y2 = affine
+    z1z1 = z1 * z1 % P
+    h = (x2 * z1z1 - x1) % P
+    r = (y2 * z1 * z1z1 - y1) % P
+    if h == 0:
+        return jacobian_double(point) if r == 0 else None
+    hh = h * h % P
+    hhh = h * hh % P
+    v = x1 * hh % P
+    x3 = (r * r - hhh - 2 * v) % P
+    return x3, (r * (v - x3) - y1 * hhh) % P, z1 * h % P
+
+
+# Convert a Jacobian point back to affine coordinates
+def jacobian_to_affine(point):
+    if point is None:
+        return None
+    x, y, z = point
+    z_inverse = pow(z, -1, P)
+    z_inverse_squared = z_inverse * z_inverse % P
+    return x * z_inverse_squared % P, y * z_inverse_squared * z_inverse % P
+
+
+# Convert many Jacobian points to affine coordinates with one shared inversion
+def batch_jacobian_to_affine(points):
+    inverses = batch_inverse([z for _, _, z in points])
+    affine = []
+    for (x, y, _), z_inverse in zip(points, inverses):
+        z_inverse_squared = z_inverse * z_inverse % P
+        affine.append((x * z_inverse_squared % P, y * z_inverse_squared * z_inverse % P))
+    return affine
+
+
+_generator_powers = []
+
+
+# Affine points [G, 2G, 4G, ..., 2^255 G], computed on first use
+def generator_powers():
+    if not _generator_powers:
+        point = G
+        for _ in range(256):
+            _generator_powers.append(point)
+            point = point_double(point)
+    return _generator_powers
+
+
+# Multiply G by a scalar in Jacobian coordinates: one mixed addition per set bit
+def jacobian_multiply_generator(scalar):
+    result = None
+    for power in generator_powers():
+        if not scalar:
+            break
+        if scalar & 1:
+            result = jacobian_add_affine(result, power)
+        scalar >>= 1
+    return result
+
+# Parse a compressed (33-byte) or uncompressed (65-byte) public key, as bytes or hex
+def decode_pubkey(pubkey):
+    if isinstance(pubkey, str):
+        pubkey = bytes.fromhex(pubkey)
+    if len(pubkey) == 65 and pubkey[0] == 4:
+        point = int.from_bytes(pubkey[1:33], "big"), int.from_bytes(pubkey[33:], "big")
+    elif len(pubkey) == 33 and pubkey[0] in (2, 3):
+        x = int.from_bytes(pubkey[1:], "big")
+        y = pow((x * x * x + 7) % P, (P + 1) // 4, P)
+        if y & 1 != pubkey[0] & 1:
+            y = P - y
+        point = x, y
+    else:
+        raise ValueError("Public key must be 33 bytes compressed or 65 bytes uncompressed")
+    x, y = point
+    if (y * y - x * x * x - 7) % P:
+        raise ValueError("Public key is not on secp256k1")
+    return point
+
+
+# Serialize an affine point as a 33-byte compressed public key
+def compress_point(point):
+    x, y = point
+    return (b'\x03' if y & 1 else b'\x02') + x.to_bytes(32, byteorder="big")
+
+
+# Hash a serialized public key: SHA256 followed by RIPEMD160
+def pubkey_to_hash160(pubkey):
+    return ripemd160(hashlib.sha256(pubkey).digest())
+
+
+# Iterate over every key in [start_key, end_key] by stepping P(k + 1) = P(k) + G
+def iterate_key_range(start_key, end_key):
+    """
+    Yield (key, compressed pubkey, hash160 digest) for each key in the range.
+    Only the first point costs a scalar multiplication; every following
+    point is a single affine addition.
+    """
+    if start_key > end_key:
+        return
+    point = point_multiply(start_key)
+    for key in range(start_key, end_key + 1):
+        pubkey = compress_point(point)
+        yield key, pubkey, pubkey_to_hash160(pubkey)
+        point = point_add(point, G)
+
+
+# Keys per batch in the batched engine; one modular inversion is shared by the whole batch
+BATCH_SIZE = 1024
+
+_generator_multiples = {}
+
+
+# Affine multiples [G, 2G, ..., count * G], cached per count
+def generator_multiples(count):
+    if count not in _generator_multiples:
+        multiples = [G]
+        for _ in range(count - 1):
+            multiples.append(point_add(multiples[-1], G))
+        _generator_multiples[count] = multiples
+    return _generator_multiples[count]
+
+
+# Invert many field elements with a single modular inversion (Montgomery's trick)
+def batch_inverse(values):
+    prefix = []
+    accumulator = 1
+    for value in values:
+        prefix.append(accumulator)
+        accumulator = accumulator * value % P
+    inverse = pow(accumulator, -1, P)
+    inverses = [0] * len(values)
+    for i in range(len(values) - 1, -1, -1):
+        inverses[i] = prefix[i] * inverse % P
+        inverse = inverse * values[i] % P
+    return inverses
+
+
+# Yield (first key, affine points) batches covering [start_key, end_key], centred on midpoint keys
+def iterate_point_batches(start_key, end_key, batch_size=BATCH_SIZE):
+    """
+    Each batch computes M +/- iG for i = 1..batch_size // 2 around a midpoint
+    M; both directions share the x difference, so a single batch inversion
+    covers the whole batch and the step to the next midpoint. A range shorter
+    than a batch gets a batch just wide enough for it.
+    """
+    full_half = max(1, batch_size // 2)
+    half = max(1, min(full_half, (end_key - start_key) // 2 + 1))
+    span = 2 * half + 1
+    if start_key <= span or end_key >= N - 2 * span:
+        # Too close to the ends of the group for the unchecked affine formulas: step
+        # one key at a time through the low keys, or through the whole range near N
+        slow_end = min(end_key, span) if end_key < N - 2 * span else end_key
+        point = point_multiply(start_key) if start_key <= slow_end else None
+        for key in range(start_key, slow_end + 1):
+            yield key, [point]
+            point = point_add(point, G)
+        start_key = max(start_key, slow_end + 1)
+    if start_key > end_key:
+        return
+
+    multiples = generator_multiples(2 * full_half + 1)  # Shared by every range size; a small batch uses a prefix
+    step = multiples[span - 1]  # span * G
+    mid = start_key + half
+    point = point_multiply(mid)
+    while True:
+        x, y = point
+        inverses = batch_inverse([mx - x for mx, _ in multiples[:half]] + [step[0] - x])
+
+        lower = []
+        upper = []
+        for (mx, my), inverse in zip(multiples[:half], inverses):
+            slope = (my - y) * inverse % P  # M + iG
+            x3 = (slope * slope - x - mx) % P
+            upper.append((x3, (slope * (x - x3) - y) % P))
+            slope = (-my - y) * inverse % P  # M - iG
+            x3 = (slope * slope - x - mx) % P
+            lower.append((x3, (slope * (x - x3) - y) % P))
+        lower.reverse()
+
+        first_key = mid - half
+        points = lower + [point] + upper
+        yield first_key, points[:end_key - first_key + 1]
+        if first_key + span > end_key:
+            return
+
+        # Step to the next midpoint: M + span * G
+        mx, my = step
+        slope = (my - y) * inverses[half] % P
+        x3 = (slope * slope - x - mx) % P
+        point = (x3, (slope * (x - x3) - y) % P)
+        mid += span
+
+
+# Iterate over [start_key, end_key] in batches centred on a midpoint key
+def iterate_key_range_batched(start_key, end_key, batch_size=BATCH_SIZE):
+    """
+    Yield the same (key, compressed pubkey, hash160 digest) tuples as
+    iterate_key_range, with one shared inversion per batch of points.
+    """
+    for key, points in iterate_point_batches(start_key, end_key, batch_size):
+        # Hash the whole batch at once (vectorized SHA256 + RIPEMD160)
+        pubkeys = [compress_point(point) for point in points]
+        for pubkey, digest in zip(pubkeys, hash160_many(pubkeys)):
+            yield key, pubkey, digest
+            key += 1
+
+
+# Iterate a segment with the batched engine, or with the ecdsa reference backend when
+# reference is set so both paths can be compared bit for bit
+def iterate_segment(start_key, end_key, batch_size=BATCH_SIZE, reference=False):
+    if reference:
+        from hash160_backend import get_backend
+        backend = get_backend("ecdsa")
+        for key in range(start_key, end_key + 1):
+            yield key, None, backend.hash160(key)
+        return
+    yield from iterate_key_range_batched(start_key, end_key, batch_size)
@@ -0,0 +1,120 @@
+import os
+import random
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, tee
+from hash160_backend import get_backend
+from secp256k1 import BATCH_SIZE, generator_multiples, generator_powers
+
+# Per-process state set up by worker initializers (Bloom filters, hash sets, targets, ...)
+_worker_state = {}
+
+
+# Prefer fork so workers inherit imported modules and precomputed tables from the parent
+def get_context():
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context("spawn")
+
+
+# Store values for the current worker process
+def set_worker_state(**values):
+    _worker_state.update(values)
+
+
+# Read a value stored by the worker initializer (or `default`, if given, when it is not set)
+def get_worker_state(name, *default):
+    return _worker_state.get(name, *default) if default else _worker_state[name]
+
+
+# Precompute the EC tables and pick the hash160 backend once, before forking or inside a spawned worker
+def load_tables():
+    generator_multiples(2 * (BATCH_SIZE // 2) + 1)
+    generator_powers()
+    get_backend()
+
+
+def _initialize_worker(initializer, initargs, cancellation, metrics):
+    # Forked workers share the parent's random state; give each one its own
+    random.seed()
+    load_tables()
+    if metrics is not None:
+        metrics.register()
+    set_worker_state(cancellation=cancellation, metrics=metrics)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+# Create a process pool whose workers run `initializer(*initargs)` once at startup
+def create_process_pool(max_workers=None, initializer=None, initargs=(), cancellation=None, metrics=None):
+    """
+    Worker processes sidestep the GIL that serializes the pure-Python EC math
+    in a thread pool. Tasks and their arguments must be picklable, so pass
+    module-level functions (or functools.partial objects) rather than lambdas,
+    and hand large shared objects to the initializer instead of every task.
+    A CancellationToken passed as `cancellation` is inherited by every worker,
+    where tasks read it with get_worker_state("cancellation"); a Metrics
+    passed as `metrics` gives each worker its own counter row.
+    """
+    load_tables()
+    return ProcessPoolExecutor(
+        max_workers=max_workers or os.cpu_count(),
+        mp_context=get_context(),
+        initializer=_initialize_worker,
+        initargs=(initializer, initargs, cancellation, metrics),
+    )
+
+
+# Pick a chunk size that gives each worker a few chunks of the items
+def chunk_size_for(item_count, max_workers, chunks_per_worker=4):
+    return max(1, item_count // (max_workers * chunks_per_worker))
+
+
+# Map a function over the items, sending them to the workers and back `chunksize` items at a time;
+# pass 1 when each item is already a chunk of work, chunk_size_for(...) when items are single keys
+def map_in_chunks(executor, function, *iterables, chunksize):
+    return executor.map(function, *iterables, chunksize=chunksize)
+
+
+# Map a function over a lazy (possibly huge) iterable with at most `window` tasks in flight
+def map_bounded(executor, function, items, window):
+    """
+    executor.map submits every item up front, which for a range generator over
+    the whole key space never finishes. This pulls the next item only when a
+    result is taken, so memory stays bounded and a slow consumer holds the
+    producer back. Results come back in submission order, and the next task
+    is submitted before a result is handed out so the workers stay busy.
+    """
+    items = iter(items)
+    pending = deque(executor.submit(function, item) for item in islice(items, window))
+    while pending:
+        result = pending.popleft().result()
+        for item in islice(items, 1):
+            pending.append(executor.submit(function, item))
+        yield result
+
+
+# Split an iterable into lists of up to `size` consecutive items, lazily
+def chunked(items, size):
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+# Map a function over contiguous chunks of the items, with at most `window` chunks in flight
+def map_chunked(executor, function, items, chunk_size, window, progress=None):
+    """
+    Per-key tasks cost a Future, a queue entry and a pickle round trip each,
+    as much as hashing the key. Here function(chunk) gets a list of up to
+    chunk_size consecutive items and returns one result for the whole chunk,
+    and chunks are cut from `items` only as map_bounded submits them, so
+    memory is bounded by the window at any item count. Yields (chunk, result)
+    in order; `progress` (e.g. a tqdm bar) advances by the chunk's length as
+    each result is taken.
+    """
+    submitted, kept = tee(chunked(items, chunk_size))  # tee holds only the chunks still in flight
+    for chunk, result in zip(kept, map_bounded(executor, function, submitted, window)):
+        if progress is not None:
+            progress.update(len(chunk))
+        yield chunk, result
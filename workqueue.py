@@ -0,0 +1,139 @@
+import sys
+import time
+import sqlite3
+
+# Constants
+QUEUE_FILE = "work_queue.sqlite"
+LEASE_SECONDS = 600  # A lease not completed or renewed within this time goes back to the queue
+ENQUEUE_BATCH = 10000  # Rows inserted per executemany call
+
+PENDING = 0
+LEASED = 1
+DONE = 2
+
+
+class WorkQueue:
+    """
+    Key ranges in one SQLite file. Keys are stored as decimal TEXT because
+    they do not fit SQLite's 64-bit integers. Leasing is one indexed
+    transaction, so a worker claims a range with O(1) I/O; leases that are
+    not completed or renewed in time expire back to pending, so a crashed
+    worker's ranges are picked up by the others.
+    """
+
+    def __init__(self, path=QUEUE_FILE, lease_seconds=LEASE_SECONDS):
+        self.lease_seconds = lease_seconds
+        # Autocommit mode; write transactions are opened explicitly with BEGIN IMMEDIATE.
+        # Threads may share one queue as long as they serialize their calls.
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS ranges (
+                id INTEGER PRIMARY KEY,
+                start TEXT NOT NULL,
+                end TEXT NOT NULL,
+                state INTEGER NOT NULL DEFAULT 0,
+                owner TEXT,
+                expires REAL,
+                result TEXT
+            );
+            CREATE INDEX IF NOT EXISTS ranges_by_state ON ranges (state, id);
+            CREATE INDEX IF NOT EXISTS ranges_found ON ranges (result) WHERE result IS NOT NULL;
+        """)
+
+    def _transaction(self, statements):
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = statements()
+            self.connection.execute("COMMIT")
+            return result
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    # Add (start, end) intervals in bulk
+    def enqueue(self, intervals):
+        rows = ((str(start), str(end)) for start, end in intervals)
+
+        def insert():
+            count = 0
+            while True:
+                batch = [row for _, row in zip(range(ENQUEUE_BATCH), rows)]
+                if not batch:
+                    return count
+                self.connection.executemany("INSERT INTO ranges (start, end) VALUES (?, ?)", batch)
+                count += len(batch)
+
+        return self._transaction(insert)
+
+    # Split [min_key, max_key] into step_size ranges and add them
+    def enqueue_ranges(self, min_key, max_key, step_size):
+        return self.enqueue((start, min(start + step_size - 1, max_key))
+                            for start in range(min_key, max_key + 1, step_size))
+
+    # Return expired leases to the queue
+    def expire(self):
+        return self.connection.execute(
+            "UPDATE ranges SET state = ?, owner = NULL, expires = NULL WHERE state = ? AND expires < ?",
+            (PENDING, LEASED, time.time()),
+        ).rowcount
+
+    # Claim up to `count` pending ranges; returns [(range_id, start, end)]
+    def lease(self, owner, count=1):
+        def claim():
+            self.expire()
+            rows = self.connection.execute(
+                "SELECT id, start, end FROM ranges WHERE state = ? ORDER BY id LIMIT ?", (PENDING, count)
+            ).fetchall()
+            self.connection.executemany(
+                "UPDATE ranges SET state = ?, owner = ?, expires = ? WHERE id = ?",
+                [(LEASED, owner, time.time() + self.lease_seconds, range_id) for range_id, _, _ in rows],
+            )
+            return [(range_id, int(start), int(end)) for range_id, start, end in rows]
+
+        return self._transaction(claim)
+
+    # Extend a lease that is still being worked on (a heartbeat); False if it was lost
+    def renew(self, range_id, owner):
+        return self.connection.execute(
+            "UPDATE ranges SET expires = ? WHERE id = ? AND state = ? AND owner = ?",
+            (time.time() + self.lease_seconds, range_id, LEASED, owner),
+        ).rowcount == 1
+
+    # Mark a range as done, optionally with the key found in it
+    def complete(self, range_id, result=None):
+        self.connection.execute(
+            "UPDATE ranges SET state = ?, expires = NULL, result = ? WHERE id = ?",
+            (DONE, None if result is None else str(result), range_id),
+        )
+
+    # Give a lease back without completing it
+    def release(self, range_id):
+        self.connection.execute(
+            "UPDATE ranges SET state = ?, owner = NULL, expires = NULL WHERE id = ? AND state = ?",
+            (PENDING, range_id, LEASED),
+        )
+
+    # First key any worker has reported, if any
+    def found_key(self):
+        row = self.connection.execute("SELECT result FROM ranges WHERE result IS NOT NULL LIMIT 1").fetchone()
+        return int(row[0]) if row else None
+
+    def has_pending(self):
+        return self.connection.execute("SELECT 1 FROM ranges WHERE state = ? LIMIT 1", (PENDING,)).fetchone() is not None
+
+    # Number of ranges in each state
+    def counts(self):
+        counts = dict.fromkeys((PENDING, LEASED, DONE), 0)
+        counts.update(self.connection.execute("SELECT state, COUNT(*) FROM ranges GROUP BY state"))
+        return {"pending": counts[PENDING], "leased": counts[LEASED], "done": counts[DONE]}
+
+    def close(self):
+        self.connection.close()
+
+
+# Usage: python workqueue.py [queue file]  (prints the queue status)
+if __name__ == "__main__":
+    queue = WorkQueue(sys.argv[1] if len(sys.argv) > 1 else QUEUE_FILE)
+    print(queue.counts())